@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
-import io
 import plotly.express as px
 import time
+import tempfile
+import shutil
+import uuid
 from modules import cleaner, database, reporter, mailer
 import os
 from dotenv import load_dotenv
@@ -18,6 +20,15 @@ load_dotenv()
 ADMIN_ID = os.getenv("ADMIN_ID", "admin")
 ADMIN_PW = os.getenv("ADMIN_PW", "1234")
 
+# 다운로드 형식: 표시 이름 → (cleaner 내보내기 형식, MIME)
+EXPORT_FORMATS = {
+    "📗 엑셀 (xlsx)": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "🧱 Parquet (zip)": ("parquet", "application/zip"),
+    "🏹 Arrow IPC (zip)": ("arrow", "application/zip"),
+    "📄 CSV gzip (zip)": ("csv", "application/zip"),
+}
+CLEANER_WORKERS = int(os.getenv("CLEANER_WORKERS", "0")) or None  # 병렬 정제를 켰을 때 프로세스 수 (0 = CPU 수)
+
 # ==========================================
 # 1. 페이지 설정 및 세션 상태
 # ==========================================
@@ -38,6 +49,11 @@ if 'mail_df' not in st.session_state:
     st.session_state['mail_df'] = None
 if 'current_sheet' not in st.session_state:
     st.session_state['current_sheet'] = None
+if 'stream_dir' not in st.session_state:
+    st.session_state['stream_dir'] = None
+if 'row_state' not in st.session_state:
+    # 증분 정제 상태는 세션마다 따로 (다른 사용자의 업로드 사본이 섞이지 않도록)
+    st.session_state['row_state'] = cleaner.RowState()
 
 
 def navigate_to(page: str):
@@ -45,7 +61,15 @@ def navigate_to(page: str):
     st.rerun()
 
 
+def clear_stream_output():
+    # 스트리밍 결과 파일(참가자 정보)은 이 세션 전용 임시 폴더에만 두고, 새로 올리거나 초기화하면 지운다
+    if st.session_state.get('stream_dir'):
+        shutil.rmtree(st.session_state['stream_dir'], ignore_errors=True)
+    st.session_state['stream_dir'] = None
+
+
 def reset_analysis():
+    clear_stream_output()
     st.session_state['analyzed_data'] = None
     st.session_state['mail_df'] = None
     st.rerun()
@@ -567,6 +591,10 @@ elif st.session_state['page'] == 'admin':
             st.error("⚠️ 데이터 초기화")
             if st.button("전체 삭제", key="db_del"):
                 database.clear_database()
+                # DB 밖에 남는 참가자 정보 (저장된 정제 결과, 이 세션의 증분 정제 상태, 내보내기 파일)도 함께 삭제
+                cleaner.clear_result_cache()
+                st.session_state['row_state'].clear()
+                cleaner.clear_exports()
                 st.toast("삭제 완료", icon="💥")
 
 # -------------------------------
@@ -575,40 +603,131 @@ elif st.session_state['page'] == 'admin':
 else:
     # 분석 전 상태
     if st.session_state['analyzed_data'] is None:
-        uploaded_file = st.file_uploader(
-            "분석할 엑셀 파일을 드래그하거나 선택하세요",
-            type=['xlsx']
+        dedup_label = st.radio(
+            "중복 처리 방식",
+            ["🗑️ 휴지통으로 분리", "🧬 골든 레코드로 병합"],
+            horizontal=True
         )
-        if uploaded_file:
-            with st.spinner("⚡ AI 엔진 구동 중..."):
-                try:
+        dedup_mode = cleaner.DEDUP_MERGE if dedup_label.startswith("🧬") else cleaner.DEDUP_TRASH
+        global_check = st.checkbox("🌐 시트·파일 통합 중복 제거 (여러 파일 함께 업로드)", value=False)
+        history_check = st.checkbox("📚 이전 행사 참가자 표시 (저장된 히스토리 기준)", value=False)
+        stream_check = st.checkbox("🗄️ 대용량 스트리밍 모드 (미리보기 없이 결과 파일만 생성)", value=False)
+        uploaded = st.file_uploader(
+            "분석할 파일(엑셀·CSV·Parquet)을 드래그하거나 선택하세요",
+            type=cleaner.INPUT_TYPES,
+            accept_multiple_files=global_check
+        )
+        files = (uploaded or []) if global_check else ([uploaded] if uploaded else [])
+        # 파일을 바꾸거나 스트리밍을 끄면 이전 결과 파일은 지운다
+        if not (files and stream_check):
+            clear_stream_output()
+        # 메모리보다 큰 명단: 청크 단위로 정제해 임시 파일에 바로 쓰고 다운로드만 제공
+        if files and stream_check:
+            if st.button("🚀 스트리밍 정제 시작", type="primary"):
+                with st.spinner("⚡ 청크 단위로 정제 중..."):
                     s = time.time()
-                    buf, clean, trash, msg = cleaner.run_cleaning_pipeline(uploaded_file)
-                    e = time.time()
+                    run_stats = {}
+                    stem = os.path.splitext(files[0].name)[0]
+                    clear_stream_output()
+                    st.session_state['stream_dir'] = tempfile.mkdtemp(prefix="stream_")
+                    out_path = os.path.join(st.session_state['stream_dir'], "cleaned.xlsx")
+                    out, clean_counts, trash_counts, msg = cleaner.run_streaming_pipeline(
+                        files, out_path, stats=run_stats, dedup_mode=dedup_mode, global_dedup=global_check,
+                        history_lookup=database.find_returning_contacts if history_check else None
+                    )
                     if msg == "Success":
-                        st.session_state['analyzed_data'] = {
-                            'excel_buffer': buf,
-                            'cleaned_data': clean,
-                            'trash_data': trash,
-                            'filename': uploaded_file.name,
-                            'elapsed': f"{e - s:.2f}s"
-                        }
-                        st.rerun()
+                        st.success(
+                            f"완료 ({time.time() - s:.2f}s) — 정제 {sum(clean_counts.values()):,}행 · "
+                            f"휴지통 {sum(trash_counts.values()):,}행 · 병합 {run_stats.get('merged_rows', 0):,}건"
+                        )
+                        with open(out, 'rb') as fh:
+                            st.download_button(
+                                "📥 결과 엑셀 다운로드", fh, file_name=f"Cleaned_{stem}.xlsx",
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            )
                     else:
+                        clear_stream_output()
                         st.error(msg)
-                except Exception as e:
-                    st.error(f"Error: {e}")
+
+        elif files:
+            # 시트 목록·행 수는 메타데이터만 읽어 먼저 보여주고, 고른 시트만 읽어서 정제
+            books = [cleaner.SourceBook(f) for f in files]
+            sheet_meta = st.session_state.setdefault('sheet_meta', {})
+            catalog = []
+            try:
+                for book in books:
+                    meta_key = (book.name, len(book.content))
+                    if meta_key not in sheet_meta:
+                        sheet_meta[meta_key] = book.row_counts()
+                    catalog += [(book.name, sn, n) for sn, n in sheet_meta[meta_key].items()]
+            except Exception as e:
+                st.error(f"파일을 열 수 없습니다: {e}")
+                st.stop()
+
+            selected = None
+            if len(catalog) > 1:
+                st.dataframe(
+                    pd.DataFrame(catalog, columns=['파일', '시트', '행 수']),
+                    hide_index=True, use_container_width=True
+                )
+                labels = {(f"{fn} · {sn}" if len(books) > 1 else sn): (fn, sn) for fn, sn, _ in catalog}
+                picked = st.multiselect("정제할 시트", list(labels), default=list(labels))
+                selected = [labels[p] for p in picked]
+
+            # 기본은 직렬 (행 수가 PARALLEL_MIN_ROWS 이상이면 cleaner 가 알아서 병렬)
+            workers = None
+            if len(catalog) > 1 and st.checkbox("⚡ 시트 병렬 정제 (CPU 여러 개 사용)", value=False):
+                workers = CLEANER_WORKERS or os.cpu_count()
+
+            incremental_check = st.checkbox("🔁 증분 정제 (같은 파일을 다시 올리면 바뀐 행만 정규화)", value=False)
+            # 결과 캐시는 참가자 명단을 서버 디스크에 남기므로 켠 경우에만
+            cache_check = st.checkbox("💾 정제 결과 저장 (같은 파일을 다시 올리면 바로 불러오기, 서버에 명단 보관)", value=False)
+
+            # 여러 파일·여러 시트는 고른 뒤 버튼으로 시작
+            start_label = "🚀 통합 정제 시작" if global_check else "🚀 정제 시작"
+            if (len(catalog) == 1 and not global_check) or st.button(start_label, type="primary"):
+                with st.spinner("⚡ AI 엔진 구동 중..."):
+                    try:
+                        s = time.time()
+                        run_stats = {}
+                        _, clean, trash, msg = cleaner.run_cleaning_pipeline(
+                            books, stats=run_stats, dedup_mode=dedup_mode, global_dedup=global_check,
+                            history_lookup=database.find_returning_contacts if history_check else None,
+                            row_state=st.session_state['row_state'] if incremental_check else None,
+                            workers=workers, excel=False, sheets=selected, use_cache=cache_check
+                        )
+                        e = time.time()
+                        if len(files) == 1:
+                            filename = files[0].name
+                        else:
+                            filename = f"{os.path.splitext(files[0].name)[0]}_외{len(files) - 1}건.xlsx"
+                        if msg == "Success":
+                            st.session_state['analyzed_data'] = {
+                                'version': uuid.uuid4().hex,
+                                'cleaned_data': clean,
+                                'trash_data': trash,
+                                'filename': filename,
+                                'elapsed': f"{e - s:.2f}s",
+                                'stats': run_stats
+                            }
+                            st.rerun()
+                        else:
+                            st.error(msg)
+                    except Exception as e:
+                        st.error(f"Error: {e}")
 
     # 분석 후 상태
     else:
         data = st.session_state['analyzed_data']
         cleaned_data = data['cleaned_data']
         trash_data = data['trash_data']
-        excel_buffer = data['excel_buffer']
         filename = data['filename']
+        run_stats = data.get('stats', {})
 
         t_clean = sum(len(df) for df in cleaned_data.values())
         t_trash = sum(len(df) for df in trash_data) if trash_data else 0
+        t_merged = run_stats.get('merged_rows', 0)
+        t_returning = run_stats.get('returning_rows', 0)
 
         # KPI 카드
         c1, c2, c3 = st.columns(3)
@@ -618,7 +737,7 @@ else:
                 <div class="kpi-card">
                     <div class="kpi-title">✨ 정제된 데이터</div>
                     <div class="kpi-value val-clean">{t_clean:,}</div>
-                    <div class="kpi-delta">Clean Rows</div>
+                    <div class="kpi-delta">{f"재방문 {t_returning:,}명" if t_returning else "Clean Rows"}</div>
                 </div>
                 """,
                 unsafe_allow_html=True
@@ -628,8 +747,8 @@ else:
                 f"""
                 <div class="kpi-card">
                     <div class="kpi-title">🗑️ 중복 데이터</div>
-                    <div class="kpi-value val-trash">{t_trash:,}</div>
-                    <div class="kpi-delta">- Duplicates</div>
+                    <div class="kpi-value val-trash">{t_trash + t_merged:,}</div>
+                    <div class="kpi-delta">{f"병합 {t_merged:,}건" if t_merged else "- Duplicates"}</div>
                 </div>
                 """,
                 unsafe_allow_html=True
@@ -640,12 +759,19 @@ else:
                 <div class="kpi-card">
                     <div class="kpi-title">🚀 처리 속도</div>
                     <div class="kpi-value val-speed">{data['elapsed']}</div>
-                    <div class="kpi-delta">Ultra Fast</div>
+                    <div class="kpi-delta">{"💾 저장된 결과 재사용" if run_stats.get('result_cache') == 'hit' else f"캐시 적중률 {run_stats.get('cache_hit_ratio', 0):.1%}"}</div>
                 </div>
                 """,
                 unsafe_allow_html=True
             )
 
+        # 같은 파일을 다시 올린 경우: 직전 실행 대비 변경분
+        if run_stats.get('delta_reused_rows'):
+            st.caption(
+                f"🔁 증분 처리 — 신규/수정 {run_stats.get('delta_new_rows', 0):,}행 · "
+                f"재사용 {run_stats['delta_reused_rows']:,}행 · 삭제 {run_stats.get('delta_removed_rows', 0):,}행"
+            )
+
         st.markdown("<br>", unsafe_allow_html=True)
         st.subheader("🛠️ 작업 컨트롤 패널")
 
@@ -657,35 +783,47 @@ else:
         with st.container():
             col_act1, col_act2, col_act3 = st.columns(3, gap="medium")
 
-            # 엑셀 다운로드
+            # 결과 다운로드 (누를 때 생성, 같은 데이터·마스킹·형식이면 만든 파일 재사용)
             with col_act1:
-                final_buffer = excel_buffer
-                if mask_check:
-                    masked_dict = {
-                        k: cleaner.mask_personal_info(v)
-                        for k, v in cleaned_data.items()
-                    }
-                    final_buffer = io.BytesIO()
-                    with pd.ExcelWriter(final_buffer, engine='xlsxwriter') as w:
-                        for k, v in masked_dict.items():
-                            v.to_excel(w, sheet_name=k, index=False)
-
-                st.download_button(
-                    "💾 엑셀 다운로드",
-                    data=final_buffer.getvalue(),
-                    file_name=f"Cleaned_{filename}",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    type="primary",
-                    use_container_width=True,
-                    key="dn_excel"
+                fmt_label = st.selectbox(
+                    "다운로드 형식", list(EXPORT_FORMATS), label_visibility="collapsed", key="export_fmt"
                 )
+                fmt, mime = EXPORT_FORMATS[fmt_label]
+                export_key = (data['version'], mask_check, fmt)
+                if st.session_state.get('export_key') != export_key:
+                    if st.button("💾 다운로드 파일 만들기", type="primary", use_container_width=True, key="btn_excel"):
+                        with st.spinner("파일 생성 중..."):
+                            st.session_state['export_path'] = cleaner.export_dataset(
+                                cleaned_data, trash_data, data['version'], masked=mask_check, fmt=fmt
+                            )
+                        st.session_state['export_key'] = export_key
+                        st.rerun()
+                elif os.path.exists(st.session_state['export_path']):
+                    with open(st.session_state['export_path'], 'rb') as fh:
+                        st.download_button(
+                            "💾 다운로드",
+                            data=fh,
+                            file_name=f"Cleaned_{os.path.splitext(filename)[0]}{cleaner.EXPORT_WRITERS[fmt][0]}",
+                            mime=mime,
+                            type="primary",
+                            use_container_width=True,
+                            key="dn_excel"
+                        )
+                else:
+                    st.session_state['export_key'] = None
+                    st.rerun()
 
             # PDF 리포트
             with col_act2:
+                # 누락 행 수는 상태 비트로 바로 센다
+                missing = [cleaner.status_counts(d) for d in cleaned_data.values()]
                 stats = {
-                    'total_rows': t_clean + t_trash,
-                    'removed_rows': t_trash,
-                    'missing_info_rows': 0
+                    'total_rows': t_clean + t_trash + t_merged,
+                    'removed_rows': t_trash + t_merged,
+                    'missing_info_rows': sum(m[0] for m in missing),
+                    'missing_by_flag': {
+                        label: sum(m[bit] for m in missing) for bit, label in cleaner.STATUS_FLAGS.items()
+                    }
                 }
                 f_path = os.path.join(
                     os.path.dirname(os.path.abspath(__file__)),
@@ -735,15 +873,20 @@ else:
                 
                 df = cleaned_data[sh]
                 with st.expander("🔍 상세 검색", expanded=False):
-                    cols = st.multiselect("필터 컬럼", df.columns)
+                    flag_labels = st.multiselect("누락 항목", list(cleaner.STATUS_FLAGS.values()))
+                    cols = st.multiselect("필터 컬럼", [c for c in df.columns if c != cleaner.STATUS_COL])
                     conds = {c: st.text_input(f"'{c}' 검색") for c in cols}
-                    view_df = df.copy()
+                    view_df = df
+                    if flag_labels:
+                        bits = sum(b for b, label in cleaner.STATUS_FLAGS.items() if label in flag_labels)
+                        view_df = view_df[cleaner.status_mask(view_df, bits)]
                     for c, val in conds.items():
                         if val: view_df = view_df[view_df[c].astype(str).str.contains(val, case=False)]
                 
                 # 템플릿
                 with st.expander("📧 메일/문자 템플릿 & 발송", expanded=False):
-                    st.info(f"사용 가능 변수: {', '.join([f'{{{c}}}' for c in df.columns])}")
+                    st.info(f"사용 가능 변수: {', '.join([f'{{{c}}}' for c in df.columns])}  \n"
+                            "빈 값에 넣을 기본값은 {소속|개인 참가} 처럼 | 뒤에 적습니다.")
                     default_msg = """[MICE 2025 컨퍼런스] 사전등록 확정 안내
 
 안녕하세요, {이름}님.
@@ -761,7 +904,7 @@ else:
                         tmpl = st.text_area("템플릿 내용", default_msg, height=200)
                         if st.button("템플릿 적용 (표에 추가)", key="apply_tmpl"):
                             try:
-                                view_df = cleaner.generate_message_column(view_df, tmpl)
+                                view_df = cleaner.generate_message_column(cleaner.render_status(view_df), tmpl)
                                 st.session_state['mail_df'] = view_df
                                 st.success("생성 완료! (아래 표 확인)")
                             except Exception as e: st.error(f"생성 실패: {e}")
@@ -778,8 +921,8 @@ else:
                         sender_pw = st.text_input("앱 비밀번호", type="password", label_visibility="collapsed")
                         mail_subject = st.text_input("메일 제목", "[MICE 2025] 등록 안내")
                         
-                        mail_cols = [c for c in display_df.columns if '이메일' in str(c) or 'email' in str(c).lower()]
-                        idx = list(display_df.columns).index(mail_cols[0]) if mail_cols else 0
+                        mail_col = cleaner.get_schema(display_df).first(cleaner.ROLE_EMAIL)
+                        idx = list(display_df.columns).index(mail_col) if mail_col is not None else 0
                         target_email_col = st.selectbox("받는 사람 이메일 컬럼", display_df.columns, index=idx)
                         
                         st.markdown("---")
@@ -788,23 +931,23 @@ else:
                         
                         if st.button("테스트 발송 (1건만)", key="test_mail_btn"):
                             if not test_receiver: st.warning("테스트 이메일을 입력하세요.")
-                            elif '생성된_메시지' not in display_df.columns: st.error("먼저 템플릿을 적용해주세요.")
+                            elif cleaner.MESSAGE_COL not in display_df.columns: st.error("먼저 템플릿을 적용해주세요.")
                             else:
-                                test_df = display_df.head(1).copy().reset_index(drop=True)
+                                test_df = display_df.head(1).reset_index(drop=True)
                                 test_df[target_email_col] = test_receiver
-                                suc, s_cnt, f_cnt, logs = mailer.send_bulk_emails(test_df, sender_email, sender_pw, target_email_col, mail_subject, '생성된_메시지', smtp_host, smtp_port)
+                                suc, s_cnt, f_cnt, logs = mailer.send_bulk_emails(test_df, sender_email, sender_pw, target_email_col, mail_subject, cleaner.MESSAGE_COL, smtp_host, smtp_port)
                                 if suc: st.success(f"테스트 발송 성공! ({test_receiver})")
                                 else: st.error(f"실패: {logs[0]}")
 
                         st.markdown("---")
                         if st.button("전체 발송 시작 (주의)", type="primary", key="send_mail_real"):
-                            if '생성된_메시지' not in display_df.columns:
+                            if cleaner.MESSAGE_COL not in display_df.columns:
                                 st.error("먼저 '템플릿 적용' 버튼을 눌러 메시지를 생성해주세요.")
                             elif not sender_email or not sender_pw:
                                 st.error("이메일 계정 정보를 입력해주세요.")
                             else:
                                 send_df = display_df.reset_index(drop=True)
-                                suc, s_cnt, f_cnt, logs = mailer.send_bulk_emails(send_df, sender_email, sender_pw, target_email_col, mail_subject, '생성된_메시지', smtp_host, smtp_port)
+                                suc, s_cnt, f_cnt, logs = mailer.send_bulk_emails(send_df, sender_email, sender_pw, target_email_col, mail_subject, cleaner.MESSAGE_COL, smtp_host, smtp_port)
                                 if suc: st.success(f"발송 완료! (성공: {s_cnt}, 실패: {f_cnt})")
                                 else: st.error(f"발송 실패: {logs[0]}")
 
@@ -816,9 +959,10 @@ else:
                 # [수정] 만족도(평점) 및 리뷰(텍스트) 분석 통합 섹션
                 # --------------------------------------------------------
                 
-                # 컬럼 감지
-                rating_cols = [c for c in display_df.columns if any(k in str(c).lower() for k in ['평점', 'rating', 'score', '점수'])]
-                review_cols = [c for c in display_df.columns if any(k in str(c).lower() for k in ['리뷰', 'review', 'comment', '의견', '코멘트'])]
+                # 컬럼 감지 (정제 시 계산된 스키마 재사용)
+                schema = cleaner.get_schema(display_df)
+                rating_cols = schema.columns_for(cleaner.ROLE_RATING)
+                review_cols = schema.columns_for(cleaner.ROLE_REVIEW)
 
                 # 1. 평점 분포 & NPS 분석
                 if rating_cols:
@@ -1013,16 +1157,7 @@ else:
 
                 if not display_df.empty:
                     # 시각화에 사용할 후보 컬럼 자동 선택
-                    excluded_keywords = [
-                        '이름', 'name', '이메일', 'email', 'phone',
-                        '전화', '비고', 'check', 'no', '메시지',
-                        '리뷰', 'review', 'comment', '의견', '코멘트',
-                        '평점', 'rating', 'score', '점수'
-                    ]
-                    potential = [
-                        c for c in display_df.columns
-                        if not any(k in str(c).lower() for k in excluded_keywords)
-                    ]
+                    potential = schema.insight_columns
 
                     if potential:
                         # 최대 6개 컬럼까지만 대시보드 생성
@@ -1032,6 +1167,7 @@ else:
                             with cols_ui[i % 2]:
                                 c_data = (
                                     display_df[col_name]
+                                    .astype(object)
                                     .fillna('미입력')
                                     .value_counts()
                                     .reset_index()
@@ -1077,7 +1213,7 @@ else:
                     st.markdown("---")
                     st.markdown("#### 📋 상세 데이터")
                     st.dataframe(
-                        display_df,
+                        cleaner.render_status(display_df),
                         use_container_width=True,
                         hide_index=True,
                         height=500
@@ -1098,7 +1234,7 @@ else:
                 subset = full_trash[full_trash['[원본시트]'] == sel].dropna(axis=1, how='all')
                 st.warning(f"🚨 {len(subset)}건 중복 제거됨")
 
-                restore_df = subset.copy()
+                restore_df = subset
                 restore_df.insert(0, "선택", False)
                 edited_trash = st.data_editor(
                     restore_df,
@@ -1112,14 +1248,8 @@ else:
                 if st.button("♻️ 선택 항목 복구", type="primary", key="restore_btn"):
                     to_restore = edited_trash[edited_trash['선택'] == True]
                     if not to_restore.empty:
-                        rows = to_restore.drop(columns=['선택'])
-                        if '[원본시트]' in rows.columns:
-                            rows = rows.drop(columns=['[원본시트]'])
-                        cur = st.session_state['analyzed_data']['cleaned_data'][sel]
-                        st.session_state['analyzed_data']['cleaned_data'][sel] = pd.concat(
-                            [cur, rows],
-                            ignore_index=True
-                        )
+                        cleaned_data = st.session_state['analyzed_data']['cleaned_data']
+                        cleaned_data[sel] = cleaner.restore_trash_rows(cleaned_data[sel], to_restore.drop(columns=['선택']))
 
                         rem = edited_trash[edited_trash['선택'] == False].drop(columns=['선택'])
                         oth = full_trash[full_trash['[원본시트]'] != sel]
@@ -1129,6 +1259,7 @@ else:
                         if not oth.empty:
                             new_trash.append(oth)
                         st.session_state['analyzed_data']['trash_data'] = new_trash
+                        st.session_state['analyzed_data']['version'] = uuid.uuid4().hex
                         st.toast("복구 완료!", icon="✅")
                         time.sleep(0.5)
                         st.rerun()
@@ -0,0 +1,262 @@
+import argparse
+import gc
+import importlib.util
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from modules import cleaner
+
+# ==========================================
+# 1. 기존 구현 (비교 기준)
+# ==========================================
+
+def legacy_normalize_strings(df):
+    mapping_dict = cleaner.load_mapping()
+    clean_mapping = {k.replace(" ", "").lower(): v for k, v in mapping_dict.items()}
+
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].apply(lambda x: x.strip() if isinstance(x, str) else x)
+
+    for col in df.columns:
+        c_lower = str(col).lower()
+        if any(k in c_lower for k in cleaner.COMPANY_KEYWORDS):
+            s = df[col].astype(str).str.lower()
+            remove_pat = r'\(주\)|\(유\)|\(사\)|\(재\)|주식회사|\binc\.?|\bcorp\.?|\bltd\.?|\bkorea|\bkr'
+            s = s.str.replace(remove_pat, '', regex=True)
+            s = s.str.replace(r'[.,()\-]', ' ', regex=True).str.strip()
+            s_lookup = s.str.replace(" ", "")
+            mapped = s_lookup.map(clean_mapping).fillna(s.str.title())
+            df[col] = np.where(df[col].isna(), df[col], mapped)
+        elif any(k in c_lower for k in cleaner.COUNTRY_KEYWORDS):
+            s = df[col].astype(str).str.lower().str.replace(" ", "").str.replace(".", "", regex=False)
+            country_map = {
+                'korea': '대한민국', 'southkorea': '대한민국', 'rok': '대한민국', 'kr': '대한민국',
+                'usa': '미국', 'us': '미국', 'america': '미국',
+                'japan': '일본', 'jp': '일본', 'china': '중국', 'cn': '중국'
+            }
+            df[col] = s.map(country_map).fillna(df[col].astype(str).str.strip())
+        elif any(k in c_lower for k in cleaner.NAME_KEYWORDS):
+            df[col] = df[col].astype(str).str.title()
+        elif any(k in c_lower for k in cleaner.EMAIL_KEYWORDS):
+            df[col] = df[col].astype(str).str.lower().str.strip()
+        elif any(k in c_lower for k in cleaner.PHONE_KEYWORDS):
+            df[col] = df[col].astype(str).str.replace(r'[^0-9+]', '', regex=True)
+            df[col] = df[col].replace({'nan': pd.NA, 'none': pd.NA, '': pd.NA})
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        df = df.replace(["", "nan", "NaN", "None", "NONE", "Nat"], pd.NA)
+    df = df.dropna(how="all")
+    return df
+
+# ==========================================
+# 2. 벤치마크용 가짜 명단
+# ==========================================
+
+def make_frame(rows, seed=0):
+    rnd = random.Random(seed)
+    companies = ['(주)삼성전자', 'LG Electronics Inc.', ' 현대자동차 ', 'SK Telecom Co., Ltd', 'naver corp',
+                 'Kakao Korea', '주식회사 토스', 'Google', 'apple', None, np.nan, '']
+    companies += [f"Company {i} Ltd." for i in range(300)]
+    countries = ['Korea', 'South Korea', 'U.S.A.', 'usa', 'Japan', 'China', '대한민국', 'Germany', None]
+    first = ['minji', 'JOHN', 'seo-yeon', '김민수', 'anna', 'lee', None]
+    rows_data = {
+        "이름 (Name)": [rnd.choice(first) for _ in range(rows)],
+        "소속 (Company)": [rnd.choice(companies) for _ in range(rows)],
+        "직급": [rnd.choice(['사원', '대리', ' 과장 ', 'Manager', None]) for _ in range(rows)],
+        "이메일 (E-mail)": [rnd.choice([f"User{i % 5000}@Example.com ", None, 'nan']) for i in range(rows)],
+        "휴대폰 (Phone)": [rnd.choice([f"010-{i % 9000 + 1000}-{i % 7000 + 1000}", f"+82 10 {i % 9000 + 1000} 0000",
+                                       1012345678, None]) for i in range(rows)],
+        "국가": [rnd.choice(countries) for _ in range(rows)],
+        "평점(0-10)": [rnd.choice([7, 9, 10, None]) for _ in range(rows)],
+        "리뷰(코멘트)": [rnd.choice(['좋았어요 ', ' Great event!', '', None]) for _ in range(rows)],
+    }
+    return pd.DataFrame({k: pd.Series(v, dtype=object) for k, v in rows_data.items()})
+
+def timed(fn, *args, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        s = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - s)
+    return best, result
+
+# ==========================================
+# 3. 실행
+# ==========================================
+
+def bench_normalize(rows):
+    df = make_frame(rows)
+    t_old, old = timed(legacy_normalize_strings, df)
+    t_new, new = timed(cleaner.normalize_strings, df)
+    # 회사명(별칭 부분 일치)과 국가명(ISO 국가 사전)은 의도적으로 결과가 달라졌으므로 비교에서 제외
+    schema = cleaner.ColumnSchema(df.columns)
+    changed_roles = (cleaner.ROLE_COMPANY, cleaner.ROLE_COUNTRY)
+    same_cols = [c for c in df.columns if schema.role(c) not in changed_roles]
+    # 빈 이름이 'Nan', 빈(None) 이메일이 'none' 이 되던 기존 동작은 고쳤으므로 결측으로 맞춰 비교
+    for c in same_cols:
+        if schema.role(c) in (cleaner.ROLE_NAME, cleaner.ROLE_EMAIL):
+            old[c] = old[c].mask(old[c].isin(['Nan', 'none']), pd.NA)
+    pd.testing.assert_frame_equal(new[same_cols], old[same_cols])
+    diff_cols = [c for c in df.columns if schema.role(c) in changed_roles]
+    changed = int((new[diff_cols].fillna('') != old[diff_cols].fillna('')).to_numpy().sum())
+    print(f"[normalize_strings] rows={rows:,}")
+    print(f"   - legacy : {t_old:.3f}s")
+    print(f"   - current: {t_new:.3f}s  (x{t_old / t_new:.1f}, 회사/국가 외 결과 동일)")
+    print(f"   - 사전 확장으로 달라진 회사/국가 셀: {changed:,}")
+
+def bench_fuzzy(rows):
+    from faker import Faker
+    fake = Faker()
+    Faker.seed(1)
+    columns = {
+        "회사": list(dict.fromkeys(fake.company() for _ in range(rows * 2)))[:rows],
+        "이름": list(dict.fromkeys(fake.name() for _ in range(rows * 2)))[:rows],
+    }
+    print(f"[find_fuzzy_duplicates] unique values={rows:,}, threshold=0.9")
+    for col, vals in columns.items():
+        df = pd.DataFrame({col: vals})
+        t, found = timed(cleaner.find_fuzzy_duplicates, df, [col], repeat=1)
+        print(f"   - {col}: {len(vals):,}개 → {len(found):,}쌍, {t:.2f}s")
+
+# ==========================================
+# 4. 메모리: 단계별 할당량 (기준 커밋의 cleaner 대비)
+# ==========================================
+
+class AllocSampler:
+    """단계별 할당량: tracemalloc(파이썬 객체·numpy 버퍼) + pyarrow 메모리 풀.
+    RSS 와 달리 앞 단계가 해제한 메모리를 다시 쓰는 것에 가려지지 않는다"""
+
+    def __init__(self, interval=0.001):
+        import pyarrow as pa
+        self.arrow = pa.total_allocated_bytes
+        self.interval = interval
+        self.arrow_peak = 0
+        self.stages = []
+        tracemalloc.start()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.arrow_peak = max(self.arrow_peak, self.arrow())
+            time.sleep(self.interval)
+
+    def current(self):
+        return tracemalloc.get_traced_memory()[0] + self.arrow()
+
+    def stage(self, name, fn):
+        gc.collect()
+        traced, arrow = tracemalloc.get_traced_memory()[0], self.arrow()
+        self.arrow_peak = arrow
+        tracemalloc.reset_peak()
+        result = fn()
+        time.sleep(self.interval * 5)
+        gc.collect()
+        # 두 최대치가 같은 순간이 아닐 수 있으므로 합은 상한
+        peak = (tracemalloc.get_traced_memory()[1] - traced) + (self.arrow_peak - arrow)
+        held = (tracemalloc.get_traced_memory()[0] - traced) + (self.arrow() - arrow)
+        self.stages.append({'stage': name, 'peak_mb': peak / 2**20, 'held_mb': held / 2**20})
+        return result
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        tracemalloc.stop()
+
+BASELINE_REV = '6998379'  # 비교 기준: 저장소 최초 커밋의 cleaner
+
+def load_baseline(rev=BASELINE_REV):
+    """git show 로 rev 시점의 modules/cleaner.py 를 임시 모듈로 불러온다 (매핑 사전은 지금 파일을 같이 쓴다)"""
+    src = subprocess.run(['git', 'show', f'{rev}:modules/cleaner.py'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                         capture_output=True, text=True, check=True).stdout
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_'), 'baseline_cleaner.py')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(src)
+    spec = importlib.util.spec_from_file_location('baseline_cleaner', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.MAPPING_FILE = cleaner.MAPPING_FILE
+    return module
+
+def memory_stages(rows, before, rev=BASELINE_REV):
+    """엑셀 입력 → 파이프라인 → 마스킹 → 메시지 → 화면용 필터.
+    before 면 rev 시점의 cleaner 와 그때 대시보드의 view_df = df.copy() 를, 아니면 지금 코드를 쓴다"""
+    module = load_baseline(rev) if before else cleaner
+    # 연락처를 행마다 다르게 해 두 쪽 모두 (중복 규칙 차이 없이) 모든 행이 뒤 단계까지 간다
+    raw = make_frame(rows)
+    raw['이름 (Name)'] = [f"{v}{i}" if isinstance(v, str) else v for i, v in enumerate(raw['이름 (Name)'])]
+    raw['이메일 (E-mail)'] = [f"user{i}@example.com" for i in range(rows)]
+    raw['휴대폰 (Phone)'] = [f"010-{i // 10000 + 1000}-{i % 10000:04d}" for i in range(rows)]
+
+    def to_xlsx(frame):
+        buf = io.BytesIO()
+        frame.to_excel(buf, sheet_name='명단', index=False)
+        return buf.getvalue()
+
+    def pipeline(data):
+        src = io.BytesIO(data)
+        src.name = 'bench.xlsx'
+        if before:
+            return module.run_cleaning_pipeline(src)
+        return module.run_cleaning_pipeline(src, use_cache=False)
+    # 지연 import (엑셀 엔진·pyarrow 등) 는 재지 않도록 작은 입력으로 한 번 먼저
+    pipeline(to_xlsx(raw.head(50)))
+    data = to_xlsx(raw)
+    del raw
+    sampler = AllocSampler()
+    held = {}
+    held['pipeline'] = sampler.stage('pipeline', lambda: pipeline(data))
+    final = held['pipeline'][1]['명단']
+    held['masked'] = sampler.stage('mask', lambda: module.mask_personal_info(final))
+    held['message'] = sampler.stage('message', lambda: module.generate_message_column(final, "{이름}님, {소속}"))
+    held['view'] = sampler.stage('view', lambda: final.copy() if before else final)
+    sampler.close()
+    return sampler.stages
+
+def bench_memory(rows, rev=BASELINE_REV):
+    # 단계별 RSS 는 프로세스마다 따로 재야 서로 섞이지 않는다
+    results = {}
+    for mode in ('before', 'after'):
+        out = subprocess.run([sys.executable, __file__, '--rows', str(rows), '--memory-mode', mode, '--baseline', rev],
+                             capture_output=True, text=True, check=True)
+        results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+    print(f"[memory] rows={rows:,}  before={rev}  (단계별 최대 할당 / 단계 후 유지분, MB)")
+    print(f"   {'stage':<10}{'before peak':>13}{'before held':>13}{'after peak':>12}{'after held':>12}")
+    for old, new in zip(results['before'], results['after']):
+        print(f"   {old['stage']:<10}{old['peak_mb']:>13.1f}{old['held_mb']:>13.1f}{new['peak_mb']:>12.1f}{new['held_mb']:>12.1f}")
+    total = {m: sum(st['held_mb'] for st in r) for m, r in results.items()}
+    print(f"   total held: before {total['before']:.1f} MB → after {total['after']:.1f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="cleaner 성능 벤치마크")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--memory", action="store_true", help="정규화 대신 단계별 메모리 벤치마크")
+    parser.add_argument("--memory-mode", choices=["before", "after"], help=argparse.SUPPRESS)
+    parser.add_argument("--baseline", default=BASELINE_REV, help="--memory 의 비교 기준 커밋")
+    parser.add_argument("--fuzzy", action="store_true", help="정규화 대신 유사 중복 탐지 벤치마크 (--rows 는 고유값 수)")
+    args = parser.parse_args()
+    if args.memory_mode:
+        print(json.dumps(memory_stages(args.rows, args.memory_mode == "before", args.baseline)))
+    elif args.memory:
+        bench_memory(args.rows, args.baseline)
+    elif args.fuzzy:
+        bench_fuzzy(args.rows)
+    else:
+        bench_normalize(args.rows)
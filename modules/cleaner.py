@@ -3,8 +3,19 @@ import re
 import json
 import os
 import io
+import threading
+import tempfile
+import pickle
+import shutil
+import sqlite3
+import hashlib
+import unicodedata
+import datetime
 import xlsxwriter
 import difflib
+import functools
+import itertools
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
 # =====================
@@ -12,12 +23,24 @@ import numpy as np
 # =====================
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MAPPING_FILE = os.path.join(BASE_DIR, 'data', 'mapping_config.json')
+COUNTRY_FILE = os.path.join(BASE_DIR, 'data', 'country_map.json')
 
 EMAIL_KEYWORDS = ['이메일', 'email', 'e-mail', 'mail']
 PHONE_KEYWORDS = ['전화', 'phone', 'tel', 'mobile', '휴대폰', '연락처', 'contact']
 NAME_KEYWORDS = ['이름', '성명', 'name', 'first name', 'last name', '참가자', 'full name', 'representative', '대표자']
 COMPANY_KEYWORDS = ['회사', '소속', 'company', 'organization', 'org', 'firm', 'agency', '부스', 'booth', '업체']
 COUNTRY_KEYWORDS = ['국가', '나라', 'country', 'nation', 'nationality', 'region']
+RATING_KEYWORDS = ['평점', 'rating', 'score', '점수']
+REVIEW_KEYWORDS = ['리뷰', 'review', 'comment', '의견', '코멘트']
+# 값 종류가 적은 컬럼 (정제 결과를 category 로 저장)
+CATEGORY_KEYWORDS = ['성별', 'gender', 'sex', '연령', 'age', '직급', '직책', '직위', '직무', 'title', 'position', 'job']
+# 인사이트 대시보드 차트에서 제외할 컬럼 (개인정보/자유서술/점수)
+INSIGHT_EXCLUDE_KEYWORDS = [
+    '이름', 'name', '이메일', 'email', 'phone',
+    '전화', '비고', 'check', 'no', '메시지',
+    '리뷰', 'review', 'comment', '의견', '코멘트',
+    '평점', 'rating', 'score', '점수'
+]
 
 DEFAULT_MAPPING = {
     '삼성': 'Samsung', '삼성전자': 'Samsung', 'samsungelectronics': 'Samsung',
@@ -25,21 +48,393 @@ DEFAULT_MAPPING = {
     'naver': 'Naver', 'kakao': 'Kakao', 'google': 'Google', 'apple': 'Apple'
 }
 
+# =====================
+# 정규화 엔진
+# =====================
+ROLE_COMPANY = 'company'
+ROLE_COUNTRY = 'country'
+ROLE_NAME = 'name'
+ROLE_EMAIL = 'email'
+ROLE_PHONE = 'phone'
+ROLE_RATING = 'rating'
+ROLE_REVIEW = 'review'
+TAG_INSIGHT_EXCLUDE = 'insight_exclude'
+TAG_CATEGORY = 'category'
+
+KEYWORD_GROUPS = {
+    ROLE_COMPANY: COMPANY_KEYWORDS,
+    ROLE_COUNTRY: COUNTRY_KEYWORDS,
+    ROLE_NAME: NAME_KEYWORDS,
+    ROLE_EMAIL: EMAIL_KEYWORDS,
+    ROLE_PHONE: PHONE_KEYWORDS,
+    ROLE_RATING: RATING_KEYWORDS,
+    ROLE_REVIEW: REVIEW_KEYWORDS,
+    TAG_INSIGHT_EXCLUDE: INSIGHT_EXCLUDE_KEYWORDS,
+    TAG_CATEGORY: CATEGORY_KEYWORDS,
+}
+
+# 키워드가 여러 역할에 걸칠 때의 우선순위 (정규화 / 마스킹)
+NORMALIZE_ORDER = (ROLE_COMPANY, ROLE_COUNTRY, ROLE_NAME, ROLE_EMAIL, ROLE_PHONE)
+MASK_ORDER = (ROLE_NAME, ROLE_PHONE, ROLE_EMAIL)
+
+def _match_tags(col):
+    c_lower = str(col).lower()
+    return frozenset(tag for tag, keywords in KEYWORD_GROUPS.items() if any(k in c_lower for k in keywords))
+
+class ColumnSchema:
+    """시트 컬럼별 키워드 매칭 결과. 시트당 한 번 계산해 df.attrs['schema']에 보관한다."""
+
+    def __init__(self, columns, base=None):
+        known = base.tags if base is not None else {}
+        self.columns = list(columns)
+        self.tags = {col: known[col] if col in known else _match_tags(col) for col in self.columns}
+
+    def role(self, col, order=NORMALIZE_ORDER):
+        tags = self.tags.get(col)
+        if tags is None: tags = _match_tags(col)
+        return next((r for r in order if r in tags), None)
+
+    @property
+    def roles(self):
+        return {col: self.role(col) for col in self.columns}
+
+    def columns_for(self, tag):
+        return [col for col in self.columns if tag in self.tags[col]]
+
+    def first(self, tag):
+        return next((col for col in self.columns if tag in self.tags[col]), None)
+
+    @property
+    def insight_columns(self):
+        return [col for col in self.columns if TAG_INSIGHT_EXCLUDE not in self.tags[col]]
+
+def get_schema(df):
+    """df에 저장된 스키마를 반환. 컬럼 구성이 바뀌었으면 새 컬럼만 매칭해 갱신한다."""
+    schema = df.attrs.get('schema')
+    if schema is None or schema.columns != list(df.columns):
+        schema = ColumnSchema(df.columns, base=schema)
+        df.attrs['schema'] = schema
+    return schema
+
+NULL_TOKENS = frozenset(["", "nan", "NaN", "None", "NONE", "Nat"])
+# read_excel / read_csv 가 기본으로 결측 처리하는 문자열 (pandas 기본 na_values 와 같음)
+READ_NA_VALUES = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+
+COMPANY_REMOVE_RE = re.compile(r'\(주\)|\(유\)|\(사\)|\(재\)|주식회사|\binc\.?|\bcorp\.?|\bltd\.?|\bkorea|\bkr')
+COMPANY_PUNCT_RE = re.compile(r'[.,()\-]')
+PHONE_STRIP_RE = re.compile(r'[^0-9+]')
+
+COUNTRY_MAP = {
+    'korea': '대한민국', 'southkorea': '대한민국', 'rok': '대한민국', 'kr': '대한민국',
+    'usa': '미국', 'us': '미국', 'america': '미국',
+    'japan': '일본', 'jp': '일본', 'china': '중국', 'cn': '중국'
+}
+
+def country_key(value):
+    """국가명 비교용 정규형: 악센트 제거, 대소문자 무시, 문자/숫자만 남김 ('U.S.A.' → 'usa')"""
+    s = unicodedata.normalize('NFKD', value.replace('&', 'and'))
+    return ''.join(c for c in s if c.isalnum() and not unicodedata.combining(c)).casefold()
+
+_country_lookup = None
+
+COUNTRY_CODE_RE = re.compile(r'[A-Z]{2,3}')
+# 'region' 컬럼의 CA/GA/IN 같은 값은 주·지역 코드일 수 있어 국가 코드로 보지 않는다
+COUNTRY_CODE_KEYWORDS = ['국가', '나라', 'country', 'nation']
+
+def get_country_lookup():
+    """data/country_map.json (ISO 3166 국가명·코드·한/영 변형)을 컴파일 → (정규형 이름 → 국가명, 코드 → 국가명). 프로세스당 한 번.
+    ISO 코드(대문자 2~3자)는 정규형 키로 넣지 않는다 ('no', 'N/A' 같은 글이 국가로 바뀌지 않도록)."""
+    global _country_lookup
+    if _country_lookup is None:
+        names, codes = dict(COUNTRY_MAP), {}
+        if os.path.exists(COUNTRY_FILE):
+            with open(COUNTRY_FILE, 'r', encoding='utf-8') as f:
+                for name, variants in json.load(f).items():
+                    for v in [name, *variants]:
+                        if COUNTRY_CODE_RE.fullmatch(v): codes[v] = name
+                        else: names[country_key(v)] = name
+        _country_lookup = (names, codes)
+    return _country_lookup
+
+def accepts_country_codes(col):
+    """국가 코드(KR, USA …)를 국가명으로 바꿔도 되는 헤더인지"""
+    c_lower = str(col).lower()
+    return any(k in c_lower for k in COUNTRY_CODE_KEYWORDS)
+
+def _is_null(x):
+    return x is None or x is pd.NA or x is pd.NaT or (isinstance(x, float) and x != x)
+
+def _is_ascii_alnum(ch):
+    return ch.isascii() and ch.isalnum()
+
+class AliasMatcher:
+    """매핑 키 전체로 만든 Aho–Corasick 오토마톤.
+    문자열에 포함된 가장 긴 별칭을 문자열 길이에 비례하는 시간에 찾는다 (별칭 개수와 무관).
+    키와 같은 기준으로 공백은 무시하고 비교하며, 영문/숫자로 끝나는 별칭은 단어 경계에서만 인정한다
+    ('sk'가 'skyline'에 걸리지 않도록)."""
+
+    def __init__(self, lookup):
+        self.lookup = lookup
+        goto, fail, out = [{}], [0], [()]
+        for key in lookup:
+            if not key: continue
+            node = 0
+            for ch in key:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({}); fail.append(0); out.append(())
+                node = nxt
+            out[node] = (key,)
+
+        # BFS로 실패 링크 계산 (깊이 1 노드는 루트), 출력은 실패 링크 쪽 결과까지 합쳐 둠
+        queue = list(goto[0].values())
+        for node in queue:
+            for ch, child in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(ch, 0)
+                out[child] = out[child] + out[fail[child]]
+                queue.append(child)
+
+        self.goto, self.fail, self.out = goto, fail, out
+
+    def find(self, text):
+        """text에 포함된 가장 긴 별칭의 매핑값, 없으면 None"""
+        goto, fail, out = self.goto, self.fail, self.out
+        n = len(text)
+        best = None
+        node = 0
+        # 공백을 건너뛰며 진행하고, 입력한 문자의 원래 위치를 기억
+        positions = []
+        for idx, ch in enumerate(text):
+            if ch == ' ': continue
+            positions.append(idx)
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for key in out[node]:
+                if best is not None and len(key) <= len(best): continue
+                start = positions[len(positions) - len(key)]
+                if _is_ascii_alnum(key[0]) and start > 0 and _is_ascii_alnum(text[start - 1]): continue
+                if _is_ascii_alnum(key[-1]) and idx + 1 < n and _is_ascii_alnum(text[idx + 1]): continue
+                best = key
+        return self.lookup[best] if best is not None else None
+
+def build_normalizer(role, clean_mapping=None, alias_matcher=None, country_codes=True):
+    """역할별 셀 변환 함수 생성 (공백 제거 → 역할 변환 → 결측 토큰 처리를 한 번에).
+    역할이 없으면 None을 반환하며, 이 경우 공백 제거/결측 토큰 처리만 적용된다.
+    country_codes 가 False 면 국가 코드는 원래 값대로 둔다."""
+    na = pd.NA
+    null_tokens = NULL_TOKENS
+
+    if role == ROLE_COMPANY:
+        lookup = clean_mapping or {}
+        find_alias = alias_matcher.find if alias_matcher is not None else None
+        remove_sub = COMPANY_REMOVE_RE.sub
+        punct_sub = COMPANY_PUNCT_RE.sub
+
+        def normalize(x):
+            if isinstance(x, str): x = x.strip()
+            elif _is_null(x): return x
+            s = punct_sub(' ', remove_sub('', str(x).lower())).strip()
+            out = lookup.get(s.replace(' ', ''))
+            if out is None and find_alias is not None: out = find_alias(s)
+            if out is None: out = s.title()
+            return na if out in null_tokens else out
+
+    elif role == ROLE_COUNTRY:
+        countries, codes = get_country_lookup()
+        if not country_codes: codes = {}
+
+        def normalize(x):
+            if _is_null(x): return na
+            s = x.strip() if isinstance(x, str) else str(x)
+            # 'N/A', 'NA' 등은 국가 코드로 보기 전에 결측으로
+            if s in READ_NA_VALUES: return na
+            out = codes.get(s)
+            if out is None: out = countries.get(country_key(s))
+            if out is None: out = s
+            return na if out in null_tokens else out
+
+    elif role == ROLE_NAME:
+        def normalize(x):
+            if _is_null(x): return na
+            out = (x.strip() if isinstance(x, str) else str(x)).title()
+            return na if out in null_tokens else out
+
+    elif role == ROLE_EMAIL:
+        def normalize(x):
+            if _is_null(x): return na
+            out = (x.strip() if isinstance(x, str) else str(x)).lower().strip()
+            return na if out in null_tokens else out
+
+    elif role == ROLE_PHONE:
+        phone_sub = PHONE_STRIP_RE.sub
+
+        def normalize(x):
+            if _is_null(x): return na
+            out = phone_sub('', x.strip() if isinstance(x, str) else str(x))
+            return na if out in null_tokens else out
+
+    else:
+        normalize = None
+
+    return normalize
+
+_MISSING = object()
+
+class NormalizationCache:
+    """워크북 단위 정규화 메모 (역할별 원본값 → 정규화값). 시트 간에 재사용된다."""
+
+    def __init__(self):
+        self.memo = {}
+        self.hits = 0
+        self.misses = 0
+        self.mapping_version = None
+
+    def bind_mapping(self, version):
+        # 매핑이 바뀌면 회사명 결과는 더 이상 유효하지 않음
+        if self.mapping_version != version:
+            self.memo.pop(ROLE_COMPANY, None)
+            self.mapping_version = version
+
+    def table(self, role):
+        return self.memo.setdefault(role, {})
+
+    def trim(self, limit):
+        # 역할별 메모를 limit 개까지만 남긴다 (먼저 넣은 값부터 버림)
+        for table in self.memo.values():
+            extra = len(table) - limit
+            if extra > 0:
+                for key in list(itertools.islice(table, extra)):
+                    del table[key]
+
+    @property
+    def entries(self):
+        return sum(len(t) for t in self.memo.values())
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+def _apply_normalizer(s, normalize, memo, cache):
+    values = s.to_numpy(dtype=object)
+    n = len(values)
+    if normalize is None:
+        normalize = _strip_or_null
+
+    # 고유값만 정규화한 뒤 정수 코드로 다시 펼침 (factorize → normalize uniques → take)
+    codes, uniques = pd.factorize(values)
+    uniq_out = np.empty(len(uniques), dtype=object)
+    is_str = np.zeros(len(uniques), dtype=bool)
+    computed = 0
+    for i, u in enumerate(uniques):
+        # 1 / 1.0 / True 처럼 해시가 같은 비문자열 값은 str() 결과가 달라 행 단위로 처리
+        if not isinstance(u, str): continue
+        is_str[i] = True
+        v = memo.get(u, _MISSING)
+        if v is _MISSING:
+            v = memo[u] = normalize(u)
+            computed += 1
+        uniq_out[i] = v
+
+    if len(uniques):
+        out = uniq_out.take(codes)
+        exact = (codes < 0) | ~is_str[codes]
+    else:
+        out = np.empty(n, dtype=object)
+        exact = np.ones(n, dtype=bool)
+    n_exact = int(exact.sum())
+    if n_exact:
+        out[exact] = [normalize(x) for x in values[exact]]
+
+    cache.misses += computed + n_exact
+    cache.hits += n - computed - n_exact
+    return out
+
+def _strip_or_null(x):
+    if isinstance(x, str):
+        x = x.strip()
+        if x in NULL_TOKENS: return pd.NA
+    return x
+
 # =====================
 # 매핑 관리 함수
 # =====================
+# 프로세스 단위 매핑 캐시: 파일 mtime이 바뀌거나 save_mapping으로 버전이 오르면 갱신
+_mapping_lock = threading.Lock()
+_mapping_state = {'version': 0, 'mtime': None, 'raw': None, 'lookup': None, 'matcher': None, 'digest': None}
+
+def _mapping_mtime():
+    try:
+        return os.stat(MAPPING_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+def _set_mapping(raw, mtime):
+    _mapping_state['raw'] = raw
+    _mapping_state['lookup'] = {k.replace(" ", "").lower(): v for k, v in raw.items() if isinstance(k, str)}
+    _mapping_state['matcher'] = None
+    _mapping_state['mtime'] = mtime
+    _mapping_state['version'] += 1
+    _mapping_state['digest'] = hashlib.sha1(json.dumps(raw, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def _refresh_mapping():
+    mtime = _mapping_mtime()
+    if _mapping_state['raw'] is not None and mtime == _mapping_state['mtime']:
+        return
+    with _mapping_lock:
+        mtime = _mapping_mtime()
+        if _mapping_state['raw'] is not None and mtime == _mapping_state['mtime']:
+            return
+        if mtime is None:
+            os.makedirs(os.path.dirname(MAPPING_FILE), exist_ok=True)
+            with open(MAPPING_FILE, 'w', encoding='utf-8') as f:
+                json.dump(DEFAULT_MAPPING, f, ensure_ascii=False, indent=4)
+            _set_mapping(dict(DEFAULT_MAPPING), _mapping_mtime())
+            return
+        with open(MAPPING_FILE, 'r', encoding='utf-8') as f:
+            _set_mapping(json.load(f), mtime)
+
 def load_mapping():
-    if not os.path.exists(MAPPING_FILE):
-        os.makedirs(os.path.dirname(MAPPING_FILE), exist_ok=True)
-        with open(MAPPING_FILE, 'w', encoding='utf-8') as f:
-            json.dump(DEFAULT_MAPPING, f, ensure_ascii=False, indent=4)
-        return DEFAULT_MAPPING
-    with open(MAPPING_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    _refresh_mapping()
+    return dict(_mapping_state['raw'])
+
+def get_mapping_lookup():
+    """(버전, 공백 제거·소문자 키 매핑) 반환. 파일이 바뀌지 않았으면 다시 읽지 않는다."""
+    _refresh_mapping()
+    return _mapping_state['version'], _mapping_state['lookup']
+
+def get_alias_matcher():
+    """현재 매핑 버전의 별칭 오토마톤 (버전당 한 번만 생성)"""
+    _refresh_mapping()
+    with _mapping_lock:
+        if _mapping_state['matcher'] is None:
+            _mapping_state['matcher'] = AliasMatcher(_mapping_state['lookup'])
+        return _mapping_state['matcher']
+
+def mapping_version():
+    _refresh_mapping()
+    return _mapping_state['version']
+
+def mapping_digest():
+    """매핑 내용의 해시. 버전 번호와 달리 프로세스가 달라도 같은 내용이면 같다."""
+    _refresh_mapping()
+    return _mapping_state['digest']
 
 def save_mapping(new_mapping):
-    with open(MAPPING_FILE, 'w', encoding='utf-8') as f:
-        json.dump(new_mapping, f, ensure_ascii=False, indent=4)
+    with _mapping_lock:
+        with open(MAPPING_FILE, 'w', encoding='utf-8') as f:
+            json.dump(new_mapping, f, ensure_ascii=False, indent=4)
+        # 저장한 내용으로 캐시를 바로 갱신 → 다른 세션은 파일을 다시 읽지 않음
+        _set_mapping(dict(new_mapping), _mapping_mtime())
 
 # =====================
 # 정제 헬퍼 함수
@@ -54,234 +449,1812 @@ def remove_sequence_columns(df):
     if cols: df = df.drop(columns=cols)
     return df
 
-def normalize_strings(df):
-    mapping_dict = load_mapping()
-    clean_mapping = {k.replace(" ", "").lower(): v for k, v in mapping_dict.items()}
-    
-    df = df.copy()
-    
-    # [핵심 수정] .str.strip() 대신 안전한 apply 방식 사용
-    # 평점(숫자) 데이터에 .str을 쓰면 에러가 나므로, isinstance(str) 체크 후 적용
-    for col in df.columns:
-        if df[col].dtype == object:
-            df[col] = df[col].apply(lambda x: x.strip() if isinstance(x, str) else x)
-
-    for col in df.columns:
-        c_lower = str(col).lower()
-        
-        # 2. 회사명 정규화
-        if any(k in c_lower for k in COMPANY_KEYWORDS):
-            s = df[col].astype(str).str.lower()
-            remove_pat = r'\(주\)|\(유\)|\(사\)|\(재\)|주식회사|\binc\.?|\bcorp\.?|\bltd\.?|\bkorea|\bkr'
-            s = s.str.replace(remove_pat, '', regex=True)
-            s = s.str.replace(r'[.,()\-]', ' ', regex=True).str.strip()
-            s_lookup = s.str.replace(" ", "")
-            mapped = s_lookup.map(clean_mapping).fillna(s.str.title())
-            df[col] = np.where(df[col].isna(), df[col], mapped)
-
-        # 3. 국가명 정규화
-        elif any(k in c_lower for k in COUNTRY_KEYWORDS):
-            s = df[col].astype(str).str.lower().str.replace(" ", "").str.replace(".", "", regex=False)
-            country_map = {
-                'korea': '대한민국', 'southkorea': '대한민국', 'rok': '대한민국', 'kr': '대한민국',
-                'usa': '미국', 'us': '미국', 'america': '미국',
-                'japan': '일본', 'jp': '일본', 'china': '중국', 'cn': '중국'
-            }
-            df[col] = s.map(country_map).fillna(df[col].astype(str).str.strip())
-
-        # 4. 이름 Title Case
-        elif any(k in c_lower for k in NAME_KEYWORDS):
-            df[col] = df[col].astype(str).str.title()
-
-        # 5. 이메일 소문자
-        elif any(k in c_lower for k in EMAIL_KEYWORDS):
-            df[col] = df[col].astype(str).str.lower().str.strip()
-
-        # 6. 전화번호 정규화
-        elif any(k in c_lower for k in PHONE_KEYWORDS):
-            df[col] = df[col].astype(str).str.replace(r'[^0-9+]', '', regex=True)
-            df[col] = df[col].replace({'nan': pd.NA, 'none': pd.NA, '': pd.NA})
-
-    df = df.replace(["", "nan", "NaN", "None", "NONE", "Nat"], pd.NA)
-    df = df.dropna(how="all")
-    return df
+# 증분 재처리: 파일 계보(lineage)별 직전 실행의 행 해시와 정규화 결과
+INCREMENTAL_MAX_LINEAGES = 8
+INCREMENTAL_MAX_ROWS = 500_000  # 상태 하나가 들고 있을 행 수 합 (정규화 결과 사본이므로 메모리에 비례)
+
+class RowState:
+    """증분 재처리 상태 (계보별 직전 실행의 행 해시·정규화 결과). 참가자 정보 사본이므로 세션마다 따로 만들어
+    run_cleaning_pipeline(row_state=...) 에 넘기고, 계보 수와 행 수 합이 상한을 넘으면 오래된 계보부터 버린다"""
+
+    def __init__(self, max_lineages=INCREMENTAL_MAX_LINEAGES, max_rows=INCREMENTAL_MAX_ROWS):
+        self.max_lineages = max_lineages
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def get(self, lineage):
+        with self._lock:
+            return self._states.get(lineage)
+
+    def previous(self, lineage, digest, columns):
+        prev = self.get(lineage)
+        if prev is None or prev['digest'] != digest or prev['columns'] != columns:
+            return None
+        return prev
+
+    def remember(self, lineage, state):
+        with self._lock:
+            self._states.pop(lineage, None)
+            # 혼자서 상한을 넘는 시트는 남기지 않는다
+            if len(state['hashes']) > self.max_rows:
+                return
+            self._states[lineage] = state
+            while len(self._states) > self.max_lineages or self.rows > self.max_rows:
+                self._states.pop(next(iter(self._states)))
+
+    @property
+    def rows(self):
+        return sum(len(st['hashes']) for st in self._states.values())
+
+    def __len__(self):
+        return len(self._states)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+def file_lineage(file_name, sheet_name):
+    """같은 내보내기 파일의 재업로드를 묶는 키. 'export (2).xlsx' 같은 다운로드 사본 번호는 무시"""
+    stem = os.path.splitext(os.path.basename(str(file_name)))[0]
+    return re.sub(r'\s*\(\d+\)$', '', stem), str(sheet_name)
+
+_type_of = np.frompyfunc(type, 1, 1)
+
+def row_hashes(df):
+    """원본 행 내용 해시 (인덱스 제외). 1 과 '1' 처럼 문자열이 같은 값도 타입으로 구분"""
+    hashed = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if col.dtype != object: continue
+        # 셀 타입 이름의 해시를 섞는다 (타입 종류는 몇 개뿐이라 factorize 후 펼침)
+        codes, types = pd.factorize(_type_of(col.to_numpy()))
+        type_hash = pd.util.hash_array(np.array([t.__name__ for t in types], dtype=object))
+        hashed = (hashed * np.uint64(0x100000001B3)) ^ type_hash[codes]
+    return hashed
+
+def normalize_strings(df, cache=None, schema=None, lineage=None, delta=None, row_state=None):
+    """row_state(RowState) 와 lineage 를 주면 직전 실행과 행 해시가 같은 행은 그때의 정규화 결과를 재사용하고
+    새/수정 행만 정규화한다. delta(dict) 에 new/reused/removed 행 수를 더한다."""
+    version, clean_mapping = get_mapping_lookup()
+    alias_matcher = get_alias_matcher()
+    if cache is None:
+        cache = NormalizationCache()
+    cache.bind_mapping(version)
+    if schema is None:
+        schema = get_schema(df)
+
+    n = len(df)
+    columns = tuple(df.columns)
+    fresh = np.ones(n, dtype=bool)
+    prev = None
+    if row_state is None:
+        lineage = None
+    if lineage is not None:
+        hashes = row_hashes(df)
+        digest = mapping_digest()
+        prev = row_state.previous(lineage, digest, columns)
+        if prev is not None:
+            # 직전 해시 → 위치 (같은 내용의 행이 여럿이면 첫 위치)
+            prev_hash, prev_first = np.unique(prev['hashes'], return_index=True)
+            found = pd.Index(prev_hash).get_indexer(hashes)
+            fresh = found < 0
+            prev_pos = prev_first[found[~fresh]]
+            if delta is not None:
+                delta['removed'] = delta.get('removed', 0) + int((~np.isin(prev_hash, hashes)).sum())
+        if delta is not None:
+            delta['new'] = delta.get('new', 0) + int(fresh.sum())
+            delta['reused'] = delta.get('reused', 0) + int(n - fresh.sum())
+    sub = df if fresh.all() else df[fresh]
+
+    # 컬럼별로 역할에 맞는 변환 함수를 한 번만 만들고, 고유값 단위로 한 번만 적용
+    normalizers = {}
+    data = {}
+    for i, col in enumerate(df.columns):
+        s = df.iloc[:, i]
+        role = schema.role(col)
+        if role is None and s.dtype != object:
+            data[i] = s
+            continue
+        # 국가 코드를 받지 않는 컬럼(region 등)은 변환 함수와 메모를 따로 쓴다
+        key = role if role != ROLE_COUNTRY or accepts_country_codes(col) else (ROLE_COUNTRY, 'names')
+        if key not in normalizers:
+            normalizers[key] = build_normalizer(role, clean_mapping, alias_matcher, country_codes=key == role)
+        out = _apply_normalizer(sub.iloc[:, i], normalizers[key], cache.table(key), cache)
+        if prev is not None:
+            merged = np.empty(n, dtype=object)
+            merged[fresh] = out
+            merged[~fresh] = prev['values'][i][prev_pos]
+            out = merged
+        data[i] = out
+
+    if lineage is not None:
+        row_state.remember(lineage, {
+            'digest': digest, 'columns': columns, 'hashes': hashes,
+            'values': {i: v for i, v in data.items() if isinstance(v, np.ndarray)},
+        })
+
+    out = pd.DataFrame(data, index=df.index)
+    out.columns = df.columns
+    out.attrs['schema'] = schema
+    # 기존 df.replace(...)가 암묵적으로 하던 dtype 추론을 명시적으로 수행
+    out = out.infer_objects()
+    out = out.dropna(how="all")
+    return out
+
+# 비고_상태체크: 행마다 uint8 비트 플래그 (라벨은 화면·내보내기 때만 render_status 로 만든다)
+STATUS_COL = '비고_상태체크'
+STATUS_NO_EMAIL = 1
+STATUS_NO_PHONE = 2
+STATUS_NO_COMPANY = 4
+# 나머지 비트(8~128)는 이후 점검 항목용
+STATUS_FLAGS = {STATUS_NO_EMAIL: "이메일 누락", STATUS_NO_PHONE: "전화번호 누락", STATUS_NO_COMPANY: "소속 누락"}
+
+def _status_label(code):
+    if code & STATUS_NO_EMAIL and code & STATUS_NO_PHONE: contact = "⚠️ 이메일, 전화번호 누락"
+    elif code & STATUS_NO_EMAIL: contact = "이메일 누락"
+    elif code & STATUS_NO_PHONE: contact = "전화번호 누락"
+    else: contact = ""
+    comp = "소속 누락" if code & STATUS_NO_COMPANY else ""
+    return " / ".join(p for p in (contact, comp) if p)
+
+# 가능한 256개 값의 라벨을 미리 만들어 두고 배열 인덱싱으로 변환
+_STATUS_LABELS = np.array([_status_label(c) for c in range(256)], dtype=object)
+
+def _any_present(df, cols):
+    if not cols:
+        return np.zeros(len(df), dtype=bool)
+    return df[cols].notna().any(axis=1).to_numpy()
 
 def flag_missing_info(df, email_cols, phone_cols, comp_cols):
-    has_email = df[email_cols].notna().any(axis=1) if email_cols else pd.Series([False]*len(df), index=df.index)
-    has_phone = df[phone_cols].notna().any(axis=1) if phone_cols else pd.Series([False]*len(df), index=df.index)
-    has_comp = df[comp_cols].notna().any(axis=1) if comp_cols else pd.Series([False]*len(df), index=df.index)
-    
-    conditions = [
-        (~has_email) & (~has_phone),
-        (~has_email),
-        (~has_phone)
-    ]
-    choices = [
-        "⚠️ 이메일, 전화번호 누락",
-        "이메일 누락",
-        "전화번호 누락"
-    ]
-    
-    contact_msg = np.select(conditions, choices, default="")
-    comp_msg = np.where(~has_comp, "소속 누락", "")
-    
-    final_msg = pd.Series(contact_msg, index=df.index)
-    mask_comp = comp_msg != ""
-    mask_contact = final_msg != ""
-    
-    final_msg[mask_comp & mask_contact] = final_msg[mask_comp & mask_contact] + " / " + comp_msg[mask_comp & mask_contact]
-    final_msg[mask_comp & ~mask_contact] = comp_msg[mask_comp & ~mask_contact]
-    
-    df['비고_상태체크'] = final_msg
+    flags = np.zeros(len(df), dtype=np.uint8)
+    for bit, cols in ((STATUS_NO_EMAIL, email_cols), (STATUS_NO_PHONE, phone_cols), (STATUS_NO_COMPANY, comp_cols)):
+        flags[~_any_present(df, cols)] |= bit
+    df[STATUS_COL] = flags
     return df
 
+def status_flags(df):
+    """STATUS_COL 의 비트 배열 (컬럼이 없거나 복구 행처럼 비어 있으면 0)"""
+    if STATUS_COL not in df.columns:
+        return np.zeros(len(df), dtype=np.uint8)
+    col = df[STATUS_COL]
+    if col.dtype == np.uint8:
+        return col.to_numpy()
+    return pd.to_numeric(col, errors='coerce').fillna(0).to_numpy(dtype=np.uint8)
+
+def status_mask(df, bits):
+    """bits 중 하나라도 켜진 행 → bool 배열"""
+    return (status_flags(df) & bits) != 0
+
+def status_counts(df):
+    """{비트: 행 수} 와 하나라도 누락된 행 수(0 키)"""
+    flags = status_flags(df)
+    counts = {bit: int(np.count_nonzero(flags & bit)) for bit in STATUS_FLAGS}
+    counts[0] = int(np.count_nonzero(flags))
+    return counts
+
+def render_status(df):
+    """STATUS_COL 비트를 사람이 읽는 라벨로 바꾼 얕은 사본 (컬럼이 없거나 이미 라벨이면 그대로)"""
+    if STATUS_COL not in df.columns or not pd.api.types.is_numeric_dtype(df[STATUS_COL]):
+        return df
+    df = df.copy(deep=False)
+    df[STATUS_COL] = _STATUS_LABELS[status_flags(df)]
+    return df
+
+# 정제 결과 타입: 텍스트 → string[pyarrow], 값 종류가 적은 컬럼 → category, 평점 → 숫자
+TEXT_DTYPE = pd.StringDtype('pyarrow')
+CATEGORY_MAX_RATIO = 0.5  # 고유값 수 / 값 수 가 이 이하일 때만 category
+
+def apply_column_types(df, schema=None):
+    """object 컬럼을 결측을 유지한 채 타입 있는 컬럼으로 바꾼다. 문자열과 다른 값이 섞인 컬럼은 그대로 둔다."""
+    if schema is None:
+        schema = get_schema(df)
+    for i, col in enumerate(df.columns):
+        s = df.iloc[:, i]
+        if s.dtype != object: continue
+        valid = s.notna().to_numpy()
+        n_valid = int(valid.sum())
+        tags = schema.tags.get(col) or _match_tags(col)
+        # 평점은 정규화 대상 역할이 아니므로 role() 이 아니라 태그로 본다
+        if ROLE_RATING in tags:
+            num = pd.to_numeric(s, errors='coerce')
+            if int(num.notna().sum()) == n_valid:
+                df.isetitem(i, num)
+                continue
+        values = s.to_numpy()[valid]
+        if n_valid and not all(isinstance(v, str) for v in values): continue
+        if (TAG_CATEGORY in tags or schema.role(col) == ROLE_COUNTRY) \
+                and len(set(values)) <= max(n_valid * CATEGORY_MAX_RATIO, 1):
+            df.isetitem(i, s.astype('category'))
+        else:
+            df.isetitem(i, s.astype(TEXT_DTYPE))
+    return df
+
+def _text_array(s):
+    # 결측은 null 로 두고 나머지는 str(값) 과 같은 문자열로
+    import pyarrow as pa
+    try:
+        return pa.array(s, from_pandas=True, type=pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array(s.astype(TEXT_DTYPE)).cast(pa.string())
+
+def _mask_name(arr):
+    # 1글자 그대로, 2글자 "김*", 그 이상은 첫·끝 글자만 남긴다
+    import pyarrow.compute as pc
+    n = pc.utf8_length(arr)
+    stars = pc.binary_repeat('*', pc.max_element_wise(pc.subtract(n, 2), 1))
+    last = pc.if_else(pc.greater(n, 2), pc.utf8_slice_codeunits(arr, -1), '')
+    masked = pc.binary_join_element_wise(pc.utf8_slice_codeunits(arr, 0, 1), stars, last, '')
+    return pc.if_else(pc.less_equal(n, 1), arr, masked)
+
+def _mask_phone(arr):
+    # 끝 4자리 앞의 4자리를 가린다 (8자리 이하는 앞부분을 버림, 4자리 이하는 그대로)
+    import pyarrow.compute as pc
+    masked = pc.binary_join_element_wise(pc.utf8_slice_codeunits(arr, 0, -8), '****', pc.utf8_slice_codeunits(arr, -4), '')
+    return pc.if_else(pc.less_equal(pc.utf8_length(arr), 4), arr, masked)
+
+def _mask_email(arr):
+    # 아이디가 3자 이상이면 앞 2자, 1~2자면 앞 1자 + "**" (아이디가 없거나 @ 가 없으면 그대로)
+    import pyarrow.compute as pc
+    # 끝에 '@' 를 붙여 나누면 항상 [아이디, 나머지+'@'] 두 조각 (원래 @ 가 없으면 나머지는 '')
+    parts = pc.split_pattern(pc.binary_join_element_wise(arr, '@', ''), '@', max_splits=1)
+    id_part, rest = pc.list_element(parts, 0), pc.list_element(parts, 1)
+    n = pc.utf8_length(id_part)
+    keep = pc.if_else(pc.less_equal(n, 2), pc.utf8_slice_codeunits(id_part, 0, 1), pc.utf8_slice_codeunits(id_part, 0, 2))
+    masked = pc.binary_join_element_wise(keep, '**@', pc.utf8_slice_codeunits(rest, 0, -1), '')
+    return pc.if_else(pc.and_(pc.greater(n, 0), pc.not_equal(rest, '')), masked, arr)
+
+_MASKERS = {ROLE_NAME: _mask_name, ROLE_PHONE: _mask_phone, ROLE_EMAIL: _mask_email}
+
 def mask_personal_info(df):
-    df = df.copy()
-    for col in df.columns:
-        c_lower = str(col).lower()
-        if any(k in c_lower for k in NAME_KEYWORDS):
-            def mask_name(val):
-                s = str(val)
-                if len(s) <= 1: return s
-                if len(s) == 2: return s[0] + "*"
-                return s[0] + "*" * (len(s) - 2) + s[-1]
-            df[col] = df[col].apply(mask_name)
-            
-        elif any(k in c_lower for k in PHONE_KEYWORDS):
-            def mask_phone(val):
-                s = str(val)
-                if len(s) <= 4: return s
-                return s[:-8] + "****" + s[-4:] if len(s) > 8 else "****" + s[-4:]
-            df[col] = df[col].apply(mask_phone)
-            
-        elif any(k in c_lower for k in EMAIL_KEYWORDS):
-            def mask_email(val):
-                s = str(val)
-                if '@' not in s: return s
-                try:
-                    id_part, domain = s.split('@', 1)
-                    masked_id = id_part[0] + "**" if len(id_part) <= 2 else id_part[:2] + "**"
-                    return masked_id + "@" + domain
-                except: return s
-            df[col] = df[col].apply(mask_email)
+    """이름·전화번호·이메일 컬럼을 열 단위(pyarrow 문자열 연산)로 가린 얕은 사본. 가린 컬럼은 TEXT_DTYPE"""
+    schema = get_schema(df)
+    df = df.copy(deep=False)
+    for i, col in enumerate(df.columns):
+        masker = _MASKERS.get(schema.role(col, MASK_ORDER))
+        if masker is None: continue
+        masked = masker(_text_array(df.iloc[:, i]))
+        df.isetitem(i, pd.Series(pd.arrays.ArrowStringArray(masked), index=df.index))
     return df
 
-def find_fuzzy_duplicates(df, cols, threshold=0.9):
-    limit = 2000 
+FUZZY_CHAR_BUCKETS = 64
+FUZZY_CHUNK_PAIRS = 1 << 19
+FUZZY_EXTRA_SEGMENTS = 1
+_HASH_BASE = np.uint64(0x100000001B3)
+_HASH_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_HASH_MIX2 = np.uint64(0x94D049BB133111EB)
+_HASH_GOLD = np.uint64(0x9E3779B97F4A7C15)
+
+def _segments(length, tau):
+    """길이 length인 문자열을 tau+1개 조각으로 나눈 (조각 번호, 시작 위치, 길이)"""
+    n = tau + 1
+    base = length // n
+    longer = length - base * n
+    segs = []
+    pos = 0
+    for i in range(n):
+        seg_len = base + (1 if i >= n - longer else 0)
+        segs.append((i, pos, seg_len))
+        pos += seg_len
+    return segs
+
+def _length_groups(svals, slens):
+    # 길이순으로 정렬된 문자열을 같은 길이끼리 (길이, 시작, 끝, 유니코드 코드 행렬) 로 묶는다
+    bounds = np.flatnonzero(np.diff(slens)) + 1
+    starts = np.concatenate(([0], bounds)).tolist()
+    ends = np.concatenate((bounds, [len(svals)])).tolist()
+    for s, e in zip(starts, ends):
+        l = int(slens[s])
+        raw = ''.join(svals[s:e]).encode('utf-32-le', 'surrogatepass')
+        yield l, s, e, np.frombuffer(raw, dtype=np.uint32).reshape(e - s, l)
+
+def _prefix_hashes(codes):
+    # 열 k 는 앞 k 글자의 다항 해시 (uint64 에서 넘치는 값은 그대로 감긴다)
+    out = np.zeros((codes.shape[0], codes.shape[1] + 1), dtype=np.uint64)
+    for k in range(codes.shape[1]):
+        out[:, k + 1] = out[:, k] * _HASH_BASE + codes[:, k].astype(np.uint64) + np.uint64(1)
+    return out
+
+def _popcount_unpacked(x):
+    # numpy 2.0 미만에는 np.bitwise_count 가 없으므로 바이트로 펼쳐 1 비트 수를 센다
+    return np.unpackbits(np.ascontiguousarray(x, dtype=np.uint64).view(np.uint8).reshape(-1, 8), axis=1) \
+        .sum(axis=1, dtype=np.uint8)
+
+_popcount = getattr(np, 'bitwise_count', None) or _popcount_unpacked
+
+def _slot_id(l, i, j=0):
+    # (길이, 조각 번호, 색인에 넣은 조각 중 순위) → 칸 번호. 배열도 받는다
+    with np.errstate(over='ignore'):
+        return ((np.uint64(l) * np.uint64(4096) + np.uint64(i + 1)) * np.uint64(4096) + np.uint64(j)) * _HASH_GOLD
+
+def _slot_keys(h, slots):
+    # 조각 해시와 칸 번호를 섞은 64비트 키 (splitmix 마무리)
+    x = h + slots
+    x ^= x >> np.uint64(30)
+    x *= _HASH_MIX1
+    x ^= x >> np.uint64(27)
+    x *= _HASH_MIX2
+    x ^= x >> np.uint64(31)
+    return x
+
+def fuzzy_candidate_pairs(vals, threshold, max_block=None):
+    """조각 역색인(pigeonhole 분할)으로 ratio >= threshold 가 될 수 있는 후보 쌍을 (m, 2) 배열(i < j, 정렬)로 반환.
+
+    SequenceMatcher.ratio() = 2M/T >= t (T = la+lb, M 은 정수) 이면 편집 거리 <= T - 2*ceil(t*T/2) 이므로,
+    짧은 쪽 문자열을 tau+1+FUZZY_EXTRA_SEGMENTS 개 조각으로 나눠 그중 흔하지 않은 tau+1 개만 색인해도
+    하나는 긴 쪽에 (위치 오차가 앞쪽 순위 이내로) 그대로 남아 있다.
+    조각은 해시 키로 바꿔 색인·조회를 모두 배열 연산으로 하고, 맞은 쌍은 문자 빈도 상한으로 한 번 더 거른다.
+    해시가 겹쳐도 후보가 늘 뿐 빠지는 쌍은 없다.
+    max_block 을 주면 그보다 많은 문자열이 공유하는 흔한 조각은 건너뛴다. 이때만 후보가 빠질 수 있다.
+    """
+    t = threshold
+    n = len(vals)
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    if t <= 0:
+        return np.column_stack(np.triu_indices(n, 1)).astype(np.int64)
+    lens = np.fromiter(map(len, vals), dtype=np.int64, count=n)
+    # 길이순으로 번호를 다시 매겨, 각 쌍을 긴 쪽(같으면 뒤쪽) 문자열에서 한 번만 찾는다
+    order = np.argsort(lens, kind='stable')
+    svals = [vals[k] for k in order]
+    slens = lens[order]
+    # 두 길이의 합 T → 허용 편집 거리
+    budget = np.arange(2 * int(slens[-1]) + 1)
+    budget = budget - 2 * np.ceil(t * budget / 2 - 1e-9).astype(np.int64)
+    # 길이 l 이 짧은 쪽일 때, 실제로 있는 상대 길이들 중 가장 큰 편집 거리
+    lengths = sorted(set(lens.tolist()))
+    taus = {l: max((budget[l + la] for la in lengths[k:] if budget[l + la] >= la - l), default=0)
+            for k, l in enumerate(lengths)}
+    # 조각으로 나눌 수 없는 짧은 문자열은 길이별 한 칸
+    segs = {l: _segments(l, min(tau + FUZZY_EXTRA_SEGMENTS, l - 1)) for l, tau in taus.items() if tau + 1 <= l}
+    rbits = max((n - 1).bit_length(), 1)
+    rmask = np.uint64((1 << rbits) - 1)
+    pows = np.array([pow(int(_HASH_BASE), k, 1 << 64) for k in range(int(slens[-1]) + 1)], dtype=np.uint64)
+    groups = list(_length_groups(svals, slens))
+    prefixes = {l: _prefix_hashes(codes) for l, _, _, codes in groups}
+
+    # 1) 색인. 키의 아래 rbits 비트에는 문자열 번호를 넣어, 정렬하면 같은 키끼리 번호순으로 모인다
+    counts = np.zeros((n, FUZZY_CHAR_BUCKETS), dtype=np.uint16)
+    seg_hashes, seg_keys = [], []
+    for l, s, e, codes in groups:
+        rows = np.arange(e - s)[:, None] * FUZZY_CHAR_BUCKETS
+        counts[s:e] = np.bincount((rows + codes % FUZZY_CHAR_BUCKETS).ravel(),
+                                  minlength=(e - s) * FUZZY_CHAR_BUCKETS).reshape(e - s, -1)
+        if l in segs:
+            starts = np.array([p for _, p, _ in segs[l]], dtype=np.int64)
+            ends = starts + np.array([seg_len for _, _, seg_len in segs[l]], dtype=np.int64)
+            h = prefixes[l][:, ends] - prefixes[l][:, starts] * pows[ends - starts]
+            seg_keys.append(_slot_keys(h, _slot_id(l, np.arange(len(starts)))) & ~rmask)
+        else:
+            h = np.zeros((e - s, 1), dtype=np.uint64)
+            seg_keys.append(_slot_keys(h, _slot_id(l, -1)) & ~rmask)
+        seg_hashes.append(h)
+    # 조각마다 같은 칸에 같은 조각을 가진 문자열 수를 세어 흔하지 않은 tau+1 개를 고르고,
+    # 고른 조각에는 앞에서부터의 순위 j 를 칸에 넣는다 (조회 때 위치 오차를 j 로 좁힌다)
+    _, inverse, freq = np.unique(np.concatenate([k.ravel() for k in seg_keys]), return_inverse=True, return_counts=True)
+    packed = []
+    pos = 0
+    for (l, s, e, _), keys, h in zip(groups, seg_keys, seg_hashes):
+        f = freq[inverse[pos:pos + keys.size]].reshape(keys.shape)
+        pos += keys.size
+        if l in segs:
+            pick = np.sort(np.argsort(f, axis=1, kind='stable')[:, :taus[l] + 1], axis=1)
+            keys = _slot_keys(np.take_along_axis(h, pick, axis=1), _slot_id(l, pick, np.arange(pick.shape[1]))) & ~rmask
+        packed.append(keys | np.arange(s, e, dtype=np.uint64)[:, None])
+    packed = np.sort(np.concatenate([k.ravel() for k in packed]))
+    members = (packed & rmask).astype(np.int64)
+    group_keys, group_start, group_size = np.unique(packed & ~rmask, return_index=True, return_counts=True)
+    group_index = pd.Index(group_keys)
+    if max_block is None:
+        max_block = n
+
+    # 버킷별 있음/없음 64비트 서명. 서로 다른 비트 수는 빈도 차이 합(= T - 2*공통 문자 수)의 하한이라
+    # 빈도 행렬(quick_ratio 와 같은 원리)을 읽기 전에 싸게 한 번 거른다
+    present = np.packbits(counts > 0, axis=1, bitorder='little').view('<u8').ravel()
+    present_m = present[members]
+    lens_m = slens[members]
+    found = []
+
+    def expand(rid, lo, cnt):
+        # 2) 맞은 그룹의 앞쪽 cnt 명과 쌍을 만들어 거른다 (k: 몇 번째 조회, pos: 색인 위치. 중복은 마지막에 제거)
+        k = np.repeat(np.arange(len(cnt), dtype=np.int32), cnt)
+        ends = np.cumsum(cnt)
+        pos = np.arange(ends[-1], dtype=np.int32) - (ends - cnt - lo).astype(np.int32)[k]
+        # 한 그룹은 길이가 모두 같아서 허용 편집 거리는 조회마다 하나
+        total = slens[rid] + lens_m[lo]
+        keep = _popcount(present[rid][k] ^ present_m[pos]) <= budget[total].astype(np.int16)[k]
+        k, pos = k[keep], pos[keep]
+        a, b = rid[k], members[pos]
+        common = np.minimum(counts[a], counts[b]).sum(axis=1, dtype=np.int64)
+        keep = 2 * common >= t * total[k] - 1e-9
+        found.append(b[keep] * n + a[keep])
+
+    def flush(rid, lo, cnt):
+        # 쌍이 FUZZY_CHUNK_PAIRS 개쯤 되도록 나눠 메모리를 묶어 둔다
+        ends = np.cumsum(cnt)
+        cuts = np.searchsorted(ends, np.arange(FUZZY_CHUNK_PAIRS, ends[-1], FUZZY_CHUNK_PAIRS), side='right')
+        for part in np.split(np.arange(len(cnt)), cuts):
+            if len(part):
+                expand(rid[part], lo[part], cnt[part])
+
+    for la, s, e, _ in groups:
+        # 길이 la 문자열이 찾아볼 (칸, 시작, 길이, 같은 길이 여부). 같은 길이 문자열은 한꺼번에 조회한다
+        plan = []
+        for l in lengths:
+            if l > la: break
+            d, delta = budget[l + la], la - l
+            if d < delta: continue
+            if l not in segs:
+                plan.append((_slot_id(l, -1), 0, 0, l == la))
+                continue
+            tau = taus[l]
+            skipped = len(segs[l]) - (tau + 1)
+            for i, p, seg_len in segs[l]:
+                # 순위 j 조각이 처음 남은 조각이면 앞쪽 편집은 j 이하, 뒤쪽은 tau-j 이하
+                for j in range(max(i - skipped, 0), min(i, tau) + 1):
+                    lo = max(p - j, p + delta - (tau - j), p - (d - delta) // 2, 0)
+                    hi = min(p + j, p + delta + (tau - j), p + (d + delta) // 2, la - seg_len)
+                    plan.extend((_slot_id(l, i, j), start, seg_len, l == la) for start in range(lo, hi + 1))
+        if not plan: continue
+        plan = np.array(plan, dtype=np.uint64)
+        starts = plan[:, 1].astype(np.int64)
+        ends = starts + plan[:, 2].astype(np.int64)
+        same = plan[:, 3].astype(bool)
+        step = max(1, FUZZY_CHUNK_PAIRS // len(plan))
+        for r0 in range(0, e - s, step):
+            prefix = prefixes[la][r0:r0 + step]
+            keys = (_slot_keys(prefix[:, ends] - prefix[:, starts] * pows[ends - starts], plan[:, 0]) & ~rmask).ravel()
+            rid = np.repeat(np.arange(s + r0, s + r0 + len(prefix), dtype=np.uint64), len(plan))
+            tie = np.tile(same, len(prefix))
+            gid = group_index.get_indexer(keys)
+            ok = gid >= 0
+            if max_block < n:
+                ok[ok] = group_size[gid[ok]] <= max_block
+            keys, rid, gid, tie = keys[ok], rid[ok], gid[ok], tie[ok]
+            # 같은 그룹을 여러 위치에서 맞혀도 한 번만
+            _, first = np.unique(rid.astype(np.int64) * len(group_keys) + gid, return_index=True)
+            keys, rid, gid, tie = keys[first], rid[first], gid[first], tie[first]
+            lo = group_start[gid]
+            cnt = group_size[gid]
+            # 같은 길이 칸에서는 자신보다 앞 번호만 (짧은 길이 칸은 모두 앞 번호)
+            cnt[tie] = np.searchsorted(packed, keys[tie] | rid[tie]) - lo[tie]
+            ok = cnt > 0
+            if ok.any():
+                flush(rid[ok].astype(np.int64), lo[ok], cnt[ok])
+
+    key = np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+    i, j = order[key // n], order[key % n]
+    pairs = np.column_stack((np.minimum(i, j), np.maximum(i, j)))
+    pairs = pairs[pairs[:, 0] < pairs[:, 1]]
+    return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+FUZZY_SCORE_CHUNK = 20000
+FUZZY_LCS_MAX_LEN = 63
+
+def _code_matrix(vals, pad):
+    # 문자열을 유니코드 코드 배열로 바꿔 (개수, 64) 행렬에 채운다. 남는 칸은 pad
+    out = np.full((len(vals), FUZZY_LCS_MAX_LEN + 1), pad, dtype=np.uint32)
+    for k, v in enumerate(vals):
+        codes = np.frombuffer(v.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        out[k, :len(codes)] = codes
+    return out
+
+def lcs_ratios(a_vals, b_vals):
+    """짝지은 문자열들의 2*LCS/(la+lb) 를 비트 병렬 LCS(Hyyrö)로 한꺼번에 계산. 63자 이하 문자열만 받는다.
+
+    SequenceMatcher 의 매칭 블록은 공통 부분열이므로 이 값은 항상 SequenceMatcher.ratio() 이상이다.
+    """
+    m = len(a_vals)
+    la = np.fromiter(map(len, a_vals), dtype=np.int64, count=m)
+    lb = np.fromiter(map(len, b_vals), dtype=np.int64, count=m)
+    A = _code_matrix(a_vals, 0xFFFFFFFF)
+    B = _code_matrix(b_vals, 0xFFFFFFFE)
+    V = np.full(m, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for k in range(int(lb.max(initial=0))):
+        # b[k] 와 같은 a 의 위치 비트마스크 (채움 칸끼리는 서로 다른 값이라 0)
+        pm = np.packbits(A == B[:, k:k + 1], axis=1, bitorder='little').view('<u8').ravel()
+        U = V & pm
+        V = (V + U) | (V - U)
+    low = (np.uint64(1) << la.astype(np.uint64)) - np.uint64(1)
+    lcs = np.unpackbits((~V & low).view(np.uint8).reshape(m, 8), axis=1).sum(axis=1)
+    total = la + lb
+    return np.divide(2.0 * lcs, total, out=np.ones(m), where=total > 0)
+
+def _score_chunk(a_vals, b_vals, threshold):
+    # 비트 병렬 LCS 비율(상한)로 먼저 자르고, 남은 쌍과 긴 문자열만 SequenceMatcher 로 확정한다
+    short = [len(a) <= FUZZY_LCS_MAX_LEN and len(b) <= FUZZY_LCS_MAX_LEN for a, b in zip(a_vals, b_vals)]
+    idx = [k for k, ok in enumerate(short) if ok]
+    passed = np.ones(len(a_vals), dtype=bool)
+    if idx:
+        passed[idx] = lcs_ratios([a_vals[k] for k in idx], [b_vals[k] for k in idx]) >= threshold
+    return np.array([bool(p) and difflib.SequenceMatcher(None, a, b).ratio() >= threshold
+                     for a, b, p in zip(a_vals, b_vals, passed)], dtype=bool)
+
+def score_pairs(a_vals, b_vals, threshold, workers=None):
+    """짝지은 문자열들이 SequenceMatcher.ratio() >= threshold 인지 bool 배열로 반환.
+
+    FUZZY_SCORE_CHUNK 쌍씩 나눠 메모리를 묶어 두고, 조각이 둘 이상이면 프로세스 풀(workers, 기본 CPU 수)에 나눠 준다.
+    """
+    chunks = [(a_vals[s:s + FUZZY_SCORE_CHUNK], b_vals[s:s + FUZZY_SCORE_CHUNK], threshold)
+              for s in range(0, len(a_vals), FUZZY_SCORE_CHUNK)]
+    if not chunks:
+        return np.zeros(0, dtype=bool)
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_score_chunk, *zip(*chunks)))
+    else:
+        results = [_score_chunk(*c) for c in chunks]
+    return np.concatenate(results)
+
+def find_fuzzy_duplicates(df, cols, threshold=0.9, max_block=None, workers=None):
     records = []
     
     for col in cols:
         if col not in df.columns: continue
         vals = df[col].dropna().astype(str).unique().tolist()
         
-        if len(vals) > limit: continue
-        
-        seen = set()
-        for i in range(len(vals)):
-            for j in range(i+1, len(vals)):
-                a, b = vals[i], vals[j]
-                if difflib.SequenceMatcher(None, a, b).ratio() >= threshold:
-                    pair = tuple(sorted([a, b]))
-                    if pair not in seen:
-                        seen.add(pair)
-                        records.append({"column": col, "val1": a, "val2": b})
+        pairs = fuzzy_candidate_pairs(vals, threshold, max_block).tolist()
+        a_vals = [vals[i] for i, _ in pairs]
+        b_vals = [vals[j] for _, j in pairs]
+        for a, b, ok in zip(a_vals, b_vals, score_pairs(a_vals, b_vals, threshold, workers)):
+            if ok:
+                records.append({"column": col, "val1": a, "val2": b})
     return pd.DataFrame(records)
 
 # [NEW] 템플릿 메시지 생성 함수 (스마트 매핑 적용)
+# {이름} 등은 역할로 찾은 컬럼, 그 밖의 {컬럼명} 은 같은 이름의 컬럼. {필드|기본값} 은 빈 값일 때 기본값
+SMART_FIELDS = {'{이름}': ROLE_NAME, '{소속}': ROLE_COMPANY, '{전화번호}': ROLE_PHONE, '{이메일}': ROLE_EMAIL}
+TEMPLATE_FIELD = re.compile(r'\{[^{}]+\}')
+MESSAGE_COL = '생성된_메시지'
+
+def compile_template(template_text, df):
+    """템플릿 → [문자열 또는 (컬럼, 기본값)] 조각 목록. 찾을 수 없는 {…} 는 글자 그대로 남긴다"""
+    schema = get_schema(df)
+    fields = {"{" + str(c) + "}": c for c in df.columns}
+    for placeholder, role in SMART_FIELDS.items():
+        col = schema.first(role)
+        if col is not None: fields[placeholder] = col
+
+    def resolve(token):
+        if token in fields: return fields[token], None
+        name, sep, default = token[1:-1].partition('|')
+        if sep and "{" + name + "}" in fields: return fields["{" + name + "}"], default
+        return None
+
+    segments, pos = [], 0
+    for m in TEMPLATE_FIELD.finditer(template_text):
+        field = resolve(m.group())
+        if field is None: continue
+        if m.start() > pos: segments.append(template_text[pos:m.start()])
+        segments.append(field)
+        pos = m.end()
+    if pos < len(template_text): segments.append(template_text[pos:])
+    return segments
+
 def generate_message_column(df, template_text):
-    df = df.copy()
-    col_map = {}
-    
-    name_col = next((c for c in df.columns if any(k in str(c).lower() for k in NAME_KEYWORDS)), None)
-    if name_col: col_map['{이름}'] = name_col
-    
-    comp_col = next((c for c in df.columns if any(k in str(c).lower() for k in COMPANY_KEYWORDS)), None)
-    if comp_col: col_map['{소속}'] = comp_col
-    
-    phone_col = next((c for c in df.columns if any(k in str(c).lower() for k in PHONE_KEYWORDS)), None)
-    if phone_col: col_map['{전화번호}'] = phone_col
-    
-    email_col = next((c for c in df.columns if any(k in str(c).lower() for k in EMAIL_KEYWORDS)), None)
-    if email_col: col_map['{이메일}'] = email_col
-
-    def apply_template(row):
-        msg = template_text
-        for placeholder, real_col in col_map.items():
-            if placeholder in msg:
-                val = str(row[real_col]) if pd.notna(row[real_col]) else ""
-                msg = msg.replace(placeholder, val)
-        for col in df.columns:
-            exact = "{" + str(col) + "}"
-            if exact in msg:
-                val = str(row[col]) if pd.notna(row[col]) else ""
-                msg = msg.replace(exact, val)
-        return msg
-
-    df['생성된_메시지'] = df.apply(apply_template, axis=1)
+    """템플릿을 한 번 해석한 뒤 조각별 컬럼을 이어 붙여(pyarrow) MESSAGE_COL 을 만든다"""
+    import pyarrow.compute as pc
+    segments = compile_template(template_text, df)
+    df = df.copy(deep=False)
+    parts = []
+    for seg in segments:
+        if isinstance(seg, str):
+            parts.append(seg)
+            continue
+        col, default = seg
+        arr = _text_array(df[col])
+        if default is not None:
+            arr = pc.if_else(pc.equal(pc.utf8_length(arr), 0), default, arr)
+        parts.append(pc.fill_null(arr, default or ''))
+    if any(not isinstance(p, str) for p in parts):
+        messages = pd.arrays.ArrowStringArray(pc.binary_join_element_wise(*parts, ''))
+    else:
+        messages = pd.array([''.join(parts)] * len(df), dtype=TEXT_DTYPE)
+    df[MESSAGE_COL] = pd.Series(messages, index=df.index)
     return df
 
 # =====================
-# 메인 파이프라인
+# 중복 판별 키 (연락처 정규형)
+# =====================
+KEY_PREFIX = '_KEY_'
+DEFAULT_COUNTRY_CODE = '82'
+
+# 로컬 파트에서 '+태그'를 무시하는 메일 서비스 (gmail은 '.'도 무시)
+GMAIL_DOMAINS = ['gmail.com', 'googlemail.com']
+PLUS_TAG_DOMAINS = GMAIL_DOMAINS + [
+    'outlook.com', 'hotmail.com', 'live.com', 'msn.com',
+    'icloud.com', 'me.com', 'mac.com', 'proton.me', 'protonmail.com', 'fastmail.com'
+]
+
+def canonical_phone(s):
+    """전화번호 → E.164 문자열 (국가번호 없으면 한국 기준). 숫자 4자리 미만은 NA."""
+    s = s.astype('string').str.replace(r'[^0-9+]', '', regex=True)
+    intl = s.str.startswith('+')
+    digits = s.str.replace('+', '', regex=False)
+    idd = ~intl & digits.str.startswith('00')
+    trunk = ~intl & ~idd & digits.str.startswith('0')
+    with_cc = ~intl & ~idd & ~trunk & digits.str.startswith(DEFAULT_COUNTRY_CODE) & (digits.str.len() >= 11)
+
+    national = '+' + DEFAULT_COUNTRY_CODE + digits
+    e164 = national.mask(intl | with_cc, '+' + digits)
+    e164 = e164.mask(idd, '+' + digits.str.slice(2))
+    e164 = e164.mask(trunk, '+' + DEFAULT_COUNTRY_CODE + digits.str.slice(1))
+    # '+82 010-...' 처럼 국가번호 뒤에 남은 국내 접두 0 제거
+    e164 = e164.str.replace(r'^\+820', '+82', regex=True)
+    return e164.where(digits.str.len() > 3)
+
+def canonical_email(s):
+    """이메일 → 비교용 정규형 (소문자, gmail의 '.'/'+태그', 주요 서비스의 '+태그' 제거). 4자 미만은 NA."""
+    s = s.astype('string').str.strip().str.lower()
+    # 값이 하나도 없으면 rpartition 이 컬럼 없는 표를 돌려주므로 바로 NA
+    if not s.notna().any():
+        return s
+    parts = s.str.rpartition('@')
+    has_at = parts[1] == '@'
+    local, domain = parts[0], parts[2].replace('googlemail.com', 'gmail.com')
+    local = local.mask(domain.isin(PLUS_TAG_DOMAINS), local.str.split('+', n=1).str[0])
+    local = local.mask(domain.isin(GMAIL_DOMAINS), local.str.replace('.', '', regex=False))
+    key = s.mask(has_at, local + '@' + domain)
+    return key.where(s.str.len() > 3)
+
+def contact_key_hash(s, role):
+    """연락처 컬럼의 정규형을 uint64 해시로 변환 (키가 없으면 NA, dtype UInt64)"""
+    key = canonical_email(s) if role == ROLE_EMAIL else canonical_phone(s)
+    valid = key.notna().to_numpy()
+    hashed = np.zeros(len(key), dtype=np.uint64)
+    if valid.any():
+        hashed[valid] = pd.util.hash_array(key[valid].to_numpy(dtype=object))
+    return pd.Series(pd.arrays.IntegerArray(hashed, ~valid), index=s.index)
+
+def add_contact_keys(df, schema):
+    """이메일/전화번호 컬럼마다 숨김 키 컬럼(_KEY_*)을 추가하고 그 이름 목록을 반환"""
+    key_cols = []
+    for role in (ROLE_EMAIL, ROLE_PHONE):
+        for c in schema.columns_for(role):
+            if c not in df.columns: continue
+            name = f"{KEY_PREFIX}{c}"
+            df[name] = contact_key_hash(df[c], role)
+            key_cols.append(name)
+    return key_cols
+
+def contact_key_frame(df):
+    """시트의 이메일/전화번호 키 해시를 긴 표로 → DataFrame(key_hash, kind, row_no). row_no 는 df 인덱스"""
+    schema = get_schema(df)
+    frames = []
+    for role in (ROLE_EMAIL, ROLE_PHONE):
+        for c in schema.columns_for(role):
+            if c not in df.columns: continue
+            key = contact_key_hash(df[c], role).dropna()
+            frames.append(pd.DataFrame({'key_hash': key.to_numpy(dtype=np.uint64), 'kind': role, 'row_no': key.index}))
+    if not frames:
+        return pd.DataFrame(columns=['key_hash', 'kind', 'row_no'])
+    return pd.concat(frames, ignore_index=True).drop_duplicates(['key_hash', 'row_no'])
+
+def drop_key_columns(df):
+    cols = [c for c in df.columns if str(c).startswith(KEY_PREFIX) or c == '_SCORE']
+    return df.drop(columns=cols) if cols else df
+
+# =====================
+# 중복 처리 (휴지통 / 골든 레코드 병합)
+# =====================
+DEDUP_TRASH = 'trash'
+DEDUP_MERGE = 'merge'
+SOURCE_ROW_COL = '[원본행]'
+
+ENTITY_COL = f"{KEY_PREFIX}entity_id"
+
+def resolve_entities(df, key_cols):
+    """이메일/전화번호 키를 하나라도 공유하는 행을 union-find 로 이어 entity_id(0부터, 처음 나온 순서)를 매긴다.
+
+    키 컬럼마다 factorize 로 '키 → 첫 행' 해시 맵을 만들고, 첫 행이 아닌 행만 그 첫 행과 합친다.
+    그래서 A-B 는 이메일, B-C 는 전화번호로 이어진 A-B-C 도 한 사람이 된다.
+    """
+    n = len(df)
+    pos = np.arange(n)
+    parent = pos.copy()
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for k in key_cols:
+        codes, _ = pd.factorize(df[k])
+        valid = codes >= 0
+        # factorize 코드는 처음 나온 순서대로 매겨지므로, 코드별 첫 행 = 첫 등장 위치 목록
+        first = pos[valid & ~pd.Series(codes).duplicated().to_numpy()]
+        rows = pos[valid]
+        heads = first[codes[valid]]
+        dup = rows != heads
+        for r, h in zip(rows[dup].tolist(), heads[dup].tolist()):
+            r, h = find(r), find(h)
+            if r != h:
+                # 항상 앞 행을 대표로 둔다
+                if r < h: r, h = h, r
+                parent[r] = h
+
+    # 경로 압축 (포인터 점프)
+    while True:
+        grand = parent[parent]
+        if np.array_equal(grand, parent): break
+        parent = grand
+    return pd.factorize(parent)[0]
+
+def split_duplicates(df):
+    """정보가 많은 행을 남기고, 같은 entity 의 나머지 행을 휴지통으로 분리 → (clean_df, trash_df)"""
+    df['_SCORE'] = df.notna().sum(axis=1)
+    df = df.sort_values('_SCORE', ascending=False)
+
+    delete_mask = df[ENTITY_COL].duplicated(keep='first').to_numpy()
+    # take 는 한 번만 복사하고 원본 참조(_is_copy)를 남기지 않으므로 .copy() 를 더 할 필요가 없다
+    return df.take(np.flatnonzero(~delete_mask)), df.take(np.flatnonzero(delete_mask))
+
+def merge_duplicates(df):
+    """같은 entity 의 행들을 골든 레코드 하나로 합친다 (컬럼별 첫 번째 비어 있지 않은 값).
+
+    정렬 없이 해시 groupby 한 번으로 처리하며, 합쳐진 원본 행 번호(1부터)를 SOURCE_ROW_COL 에 남긴다.
+    """
+    entity = df[ENTITY_COL].to_numpy()
+    merged = df.groupby(entity, sort=False).first()
+
+    row_ids = pd.Series((df.index + 1).astype(str), index=entity)
+    sizes = np.bincount(entity, minlength=len(df))
+    sources = row_ids[sizes[entity] == 1]
+    multi = row_ids[sizes[entity] > 1]
+    if len(multi):
+        sources = pd.concat([sources, multi.groupby(level=0, sort=False).agg(', '.join)])
+    merged.insert(0, SOURCE_ROW_COL, sources.reindex(merged.index).to_numpy())
+    # entity 번호는 처음 나온 순서이므로 첫 행의 원래 인덱스를 골든 레코드의 인덱스로 쓴다
+    merged.index = df.index[~pd.Series(entity).duplicated().to_numpy()]
+    return merged
+
+# =====================
+# 시트·파일 간 통합 중복 제거
+# =====================
+KEEP_SHEET_COL = '[유지시트]'
+
+def _entity_keys(df, key_cols):
+    # 모든 키 컬럼의 (키 해시, entity) 를 한 줄로 모은다
+    entity = df[ENTITY_COL].to_numpy()
+    hashes, owners = [], []
+    for k in key_cols:
+        col = df[k]
+        valid = col.notna().to_numpy()
+        hashes.append(col.to_numpy(dtype=np.uint64, na_value=0)[valid])
+        owners.append(entity[valid])
+    if not hashes:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    return np.concatenate(hashes), np.concatenate(owners)
+
+class ContactKeyIndex:
+    """여러 시트와 업로드 파일에 걸친 연락처 키 색인 (키 해시 → 먼저 등록한 (시트, 행))"""
+
+    def __init__(self):
+        self.owners = {}
+        self.locations = []
+
+    def match(self, df, key_cols):
+        """entity 별로 이미 색인된 키 중 가장 먼저 등록된 위치 번호 (없으면 -1)"""
+        n_entities = int(df[ENTITY_COL].max()) + 1 if len(df) else 0
+        hit = np.full(n_entities, -1, dtype=np.int64)
+        hashes, entity = _entity_keys(df, key_cols)
+        if len(hashes) and self.owners:
+            loc = pd.Series(hashes).map(self.owners).to_numpy()
+            found = ~np.isnan(loc)
+            if found.any():
+                first = pd.Series(loc[found].astype(np.int64)).groupby(entity[found]).min()
+                hit[first.index.to_numpy()] = first.to_numpy()
+        return hit
+
+    def register(self, df, key_cols, label, survivors):
+        """survivors(entity → 남은 행의 원래 인덱스) 에 속한 entity 의 모든 키를 (label, 행 번호) 위치로 등록"""
+        base = len(self.locations)
+        entity_loc = pd.Series(np.arange(base, base + len(survivors)), index=survivors.index)
+        self.locations.extend((label, int(row) + 1) for row in survivors.to_numpy())
+        hashes, entity = _entity_keys(df, key_cols)
+        loc = entity_loc.reindex(entity).to_numpy()
+        keep = ~np.isnan(loc)
+        self.owners.update(zip(hashes[keep].tolist(), loc[keep].astype(np.int64).tolist()))
+
+def restore_trash_rows(cleaned, rows):
+    """휴지통에서 고른 행을 정제 시트 뒤에 붙인다. 휴지통에만 있는 컬럼([원본시트], [유지시트])은 빼고
+    정제 시트에 상태 컬럼이 있으면 복구한 행도 다시 채운다"""
+    rows = rows.drop(columns=['[원본시트]', KEEP_SHEET_COL], errors='ignore')
+    if STATUS_COL in cleaned.columns:
+        schema = get_schema(rows)
+        rows = flag_missing_info(rows, *[schema.columns_for(r) for r in (ROLE_EMAIL, ROLE_PHONE, ROLE_COMPANY)])
+    return pd.concat([cleaned, rows], ignore_index=True)
+
+HISTORY_COL = '[이전참가]'
+
+def flag_returning_contacts(df, key_cols, lookup):
+    """lookup(키 해시 배열) 로 이전 배치에 같은 연락처가 있는 행을 찾아 HISTORY_COL 에 배치 이름을 남긴다. 찾은 행 수 반환"""
+    pos = np.arange(len(df))
+    hashes, rows = [], []
+    for k in key_cols:
+        valid = df[k].notna().to_numpy()
+        hashes.append(df[k].to_numpy(dtype=np.uint64, na_value=0)[valid])
+        rows.append(pos[valid])
+    history = pd.Series('', index=df.index, dtype=object)
+    if hashes and sum(len(h) for h in hashes):
+        probe = pd.DataFrame({'key_hash': np.concatenate(hashes), 'pos': np.concatenate(rows)})
+        found = lookup(probe['key_hash'].to_numpy())
+        if len(found):
+            hit = probe.merge(found[['key_hash', 'batch']], on='key_hash').drop_duplicates(['pos', 'batch'])
+            batches = hit.groupby('pos', sort=False)['batch'].agg(', '.join)
+            history.iloc[batches.index.to_numpy()] = batches.to_numpy()
+    df[HISTORY_COL] = history
+    return int((history != '').sum())
+
+def _sheet_label(file_name, sheet_name, multi_file, used):
+    # 여러 파일이면 '파일명_시트명', 엑셀 시트 이름 규칙(31자, 금지 문자)에 맞추고 겹치면 번호를 붙인다
+    label = f"{os.path.splitext(os.path.basename(file_name))[0]}_{sheet_name}" if multi_file else str(sheet_name)
+    label = re.sub(r'[\[\]:*?/\\]', '_', label)[:31]
+    base, k = label, 2
+    while label in used:
+        suffix = f"({k})"
+        label = base[:31 - len(suffix)] + suffix
+        k += 1
+    used.add(label)
+    return label
+
+# =====================
+# 입력 파일 (xlsx / xlsb / csv / parquet)
 # =====================
-def run_cleaning_pipeline(uploaded_file):
+INPUT_TYPES = ['xlsx', 'xlsm', 'xlsb', 'xls', 'csv', 'parquet']
+CSV_ENCODINGS = ('utf-8-sig', 'cp949')
+
+def _excel_engine(kind='xlsx'):
     try:
+        import python_calamine
+        return 'calamine'
+    except ImportError:
+        return {'xlsb': 'pyxlsb', 'xls': 'xlrd'}.get(kind, 'openpyxl')
+
+def _file_bytes(f):
+    if hasattr(f, 'getvalue'): return f.getvalue()
+    if hasattr(f, 'read'):
+        f.seek(0)
+        return f.read()
+    with open(f, 'rb') as fh:
+        return fh.read()
+
+def _file_kind(name):
+    return os.path.splitext(str(name))[1].lower().lstrip('.') or 'xlsx'
+
+class SourceBook:
+    """업로드 파일 하나. 시트 이름과 행 수는 메타데이터만 읽어 먼저 알려주고, 시트 내용은 read() 할 때 읽는다.
+
+    csv / parquet 는 파일 이름(확장자 제외)을 시트 이름으로 하는 시트 하나짜리 책으로 다룬다.
+    프로세스 풀로 보낼 때는 파일 바이트와 이름만 넘어간다.
+    """
+
+    def __init__(self, source, name=None):
+        self.name = name or getattr(source, 'name', None) or str(source)
+        self.kind = _file_kind(self.name)
+        self.content = _file_bytes(source)
+        self._excel = None
+        self._row_counts = None
+
+    def __getstate__(self):
+        return {'name': self.name, 'kind': self.kind, 'content': self.content, '_excel': None, '_row_counts': None}
+
+    @property
+    def digest(self):
+        """파일 내용 해시 (결과 캐시 키)"""
+        return hashlib.sha1(self.content).hexdigest()
+
+    @property
+    def is_excel(self):
+        return self.kind not in ('csv', 'parquet')
+
+    def _excel_file(self):
+        if self._excel is None:
+            self._excel = pd.ExcelFile(io.BytesIO(self.content), engine=_excel_engine(self.kind))
+        return self._excel
+
+    @property
+    def sheet_names(self):
+        if self.is_excel:
+            return list(self._excel_file().sheet_names)
+        return [os.path.splitext(os.path.basename(str(self.name)))[0]]
+
+    def row_counts(self):
+        """시트 이름 → 데이터 행 수 (헤더 제외, 메타데이터로 알 수 없으면 None)"""
+        if self._row_counts is None:
+            self._row_counts = self._read_row_counts()
+        return self._row_counts
+
+    def _read_row_counts(self):
+        name = self.sheet_names[0]
+        if self.kind == 'parquet':
+            import pyarrow.parquet as pq
+            return {name: pq.ParquetFile(io.BytesIO(self.content)).metadata.num_rows}
+        if self.kind == 'csv':
+            lines = self.content.count(b'\n') + (not self.content.endswith(b'\n'))
+            return {name: max(lines - 1, 0)}
+        if self.kind not in ('xlsx', 'xlsm'):
+            return dict.fromkeys(self.sheet_names)
+        # xlsx 는 read-only 로 열면 각 시트의 dimension 만 읽는다
+        import openpyxl
+        wb = openpyxl.load_workbook(io.BytesIO(self.content), read_only=True)
         try:
-            import python_calamine
-            engine = 'calamine'
-        except ImportError:
-            engine = 'openpyxl'
-        sheets = pd.read_excel(uploaded_file, sheet_name=None, dtype=object, engine=engine)
+            return {ws.title: max(ws.max_row - 1, 0) if ws.max_row else None for ws in wb.worksheets}
+        finally:
+            wb.close()
+
+    def read(self, sheet_name):
+        """시트 하나를 object dtype DataFrame 으로 (pd.read_excel(dtype=object) 과 같은 모양)"""
+        if self.kind == 'parquet':
+            return pd.read_parquet(io.BytesIO(self.content)).astype(object)
+        if self.kind == 'csv':
+            for enc in CSV_ENCODINGS:
+                try:
+                    return pd.read_csv(io.BytesIO(self.content), dtype=object, encoding=enc)
+                except UnicodeDecodeError:
+                    if enc == CSV_ENCODINGS[-1]: raise
+        return pd.read_excel(self._excel_file(), sheet_name=sheet_name, dtype=object)
+
+# =====================
+# 결과 캐시 (파일 내용 주소 기반, Arrow IPC)
+# =====================
+# 정제된 참가자 명단(이름·이메일·전화번호)이 그대로 저장되므로 기본은 끄고(use_cache=False) 켠 경우에만 쓴다.
+# 크기 한도(RESULT_CACHE_MAX_BYTES)를 넘으면 오래된 결과부터 지우고, clear_result_cache 로 전부 지운다.
+# 저장 형식은 Arrow IPC 뿐이다 (pickle 은 쓰지 않으므로 캐시 디렉터리의 파일을 읽어도 코드가 실행되지 않는다).
+RESULT_CACHE_DIR = os.getenv('CLEANER_RESULT_CACHE', os.path.join(BASE_DIR, 'data', 'result_cache'))
+RESULT_CACHE_MAX_BYTES = int(os.getenv('CLEANER_RESULT_CACHE_MB', '512')) << 20
+PIPELINE_VERSION = 7  # 정제 결과나 저장 형식이 달라지는 변경을 하면 올린다
+_ROW_COL = f"{KEY_PREFIX}row"
+_result_cache_lock = threading.Lock()
+
+def result_cache_key(books, sheets=None, **options):
+    """(파일 내용 해시, 매핑 내용 해시, 파이프라인 버전, 옵션) → 캐시 디렉터리 이름"""
+    h = hashlib.sha1()
+    for book in books:
+        h.update(f"{book.name}\0{book.digest}\0".encode())
+    picked = sorted([str(f), str(sh)] for f, sh in sheets) if sheets is not None else None
+    h.update(json.dumps([picked, options, mapping_digest(), PIPELINE_VERSION], sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+# 결측 종류: object 컬럼의 결측이 한 종류면 그대로 되돌린다
+_NULL_KINDS = {'nan': np.nan, 'na': pd.NA, 'none': None}
+
+def _null_kind(v):
+    if v is None: return 'none'
+    if v is pd.NA: return 'na'
+    if isinstance(v, float): return 'nan'
+    return None
+
+# 값의 타입이 섞인 object 컬럼: 셀마다 (문자열, 타입 태그) 두 Arrow 컬럼으로 두고 읽을 때 태그대로 되돌린다
+_VALUE_TYPES = [
+    (str, str), (int, int), (float, float), (bool, lambda s: s == 'True'),
+    (type(None), lambda s: None), (type(pd.NA), lambda s: pd.NA), (type(pd.NaT), lambda s: pd.NaT),
+    (pd.Timestamp, pd.Timestamp), (datetime.datetime, datetime.datetime.fromisoformat),
+    (datetime.date, datetime.date.fromisoformat), (datetime.time, datetime.time.fromisoformat),
+]
+_VALUE_TAGS = {t: k for k, (t, _) in enumerate(_VALUE_TYPES)}
+
+def _value_text(v):
+    # isoformat 은 fromisoformat / Timestamp 로 그대로 되돌아온다 (str(float) 도 같은 값으로 돌아옴)
+    return v.isoformat() if isinstance(v, (datetime.date, datetime.time)) else str(v)
+
+def _object_plan(df):
+    """object 컬럼 → ({위치: 결측 종류} Arrow 문자열로 둘 컬럼, [위치] 값·타입 태그로 둘 컬럼).
+    문자열만 있고 결측이 한 종류인 컬럼만 Arrow 문자열로, 숫자가 섞이거나(평점 5 와 '5') 결측이 섞인 컬럼은 태그와 함께.
+    태그가 없는 타입의 값이 있으면 ValueError"""
+    text, raw = {}, []
+    for i, dt in enumerate(df.dtypes):
+        if dt != object: continue
+        values = df.iloc[:, i].to_numpy()
+        nulls = pd.isna(values)
+        kinds = {_null_kind(v) for v in values[nulls]}
+        if len(kinds) <= 1 and None not in kinds and all(isinstance(v, str) for v in values[~nulls]):
+            text[i] = kinds.pop() if kinds else 'nan'
+        else:
+            unknown = set(_type_of(values)) - set(_VALUE_TAGS)
+            if unknown:
+                raise ValueError(f"캐시할 수 없는 값 타입: {sorted(t.__name__ for t in unknown)}")
+            raw.append(i)
+    return text, raw
+
+def _write_ipc(path, df):
+    """df → path (Arrow IPC). 읽을 때 쓸 (결측 종류, 값·태그로 둔 컬럼 위치) 를 반환"""
+    # 압축 없이 써야 읽을 때 memory_map 으로 바로 열 수 있다
+    import pyarrow as pa
+    text, raw = _object_plan(df)
+    keep = [i for i in range(df.shape[1]) if i not in raw]
+    base = _arrow_table(df.iloc[:, keep])
+    arrays, names = base.columns, base.column_names
+    for i in raw:
+        values = df.iloc[:, i].to_numpy()
+        tags = pd.Series(_type_of(values)).map(_VALUE_TAGS).to_numpy(dtype=np.int8)
+        arrays += [pa.array([_value_text(v) for v in values], type=pa.string()), pa.array(tags)]
+        names += [f"{KEY_PREFIX}raw{i}", f"{KEY_PREFIX}tag{i}"]
+    table = pa.Table.from_arrays(arrays + [pa.array(df.index.to_numpy())], names=names + [_ROW_COL])
+    with pa.ipc.new_file(path, table.schema) as w:
+        w.write_table(table)
+    return [[i, kind] for i, kind in text.items()], raw
+
+def _restore_values(texts, tags):
+    out = np.empty(len(texts), dtype=object)
+    for tag in np.unique(tags).tolist():
+        at = np.flatnonzero(tags == tag)
+        convert = _VALUE_TYPES[tag][1]
+        out[at] = [convert(s) for s in texts[at].tolist()]
+    return out
+
+def _read_ipc(path, columns, text=(), raw=()):
+    import pyarrow as pa
+    with pa.memory_map(path) as src:
+        table = pa.ipc.open_file(src).read_all()
+    restored = {}
+    for i in raw:
+        texts = table.column(f"{KEY_PREFIX}raw{i}").to_numpy(zero_copy_only=False)
+        tags = table.column(f"{KEY_PREFIX}tag{i}").to_numpy()
+        restored[i] = _restore_values(texts, tags)
+        table = table.drop_columns([f"{KEY_PREFIX}raw{i}", f"{KEY_PREFIX}tag{i}"])
+    df = table.to_pandas(types_mapper={pa.string(): TEXT_DTYPE, pa.large_string(): TEXT_DTYPE}.get)
+    df.index = pd.Index(df.pop(_ROW_COL).to_numpy())
+    for i in sorted(raw):
+        df.insert(i, f"{KEY_PREFIX}raw{i}", restored[i])
+    df.columns = columns
+    # 저장 전 object 였던 문자열 컬럼은 object 로, 결측은 원래 종류(NaN/<NA>/None)로 되돌린다
+    for i, kind in text:
+        col = df.iloc[:, i].astype(object)
+        df.isetitem(i, col.where(col.notna(), _NULL_KINDS[kind]))
+    return df
+
+def save_result(key, cleaned_sheets, trash_list, stats=None):
+    """정제 시트·휴지통을 RESULT_CACHE_DIR/key 아래 Arrow IPC 파일로 저장 (임시 디렉터리에 쓴 뒤 이름 바꾸기)"""
+    final = os.path.join(RESULT_CACHE_DIR, key)
+    if os.path.isdir(final): return
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=RESULT_CACHE_DIR, prefix='.tmp-')
+    try:
+        meta = {'sheets': [], 'trash': [], 'stats': stats or {}}
+        for k, (name, df) in enumerate(cleaned_sheets.items()):
+            text, raw = _write_ipc(os.path.join(tmp, f"clean_{k}.arrow"), df)
+            meta['sheets'].append([name, [str(c) for c in df.columns], text, raw])
+        for k, df in enumerate(trash_list):
+            text, raw = _write_ipc(os.path.join(tmp, f"trash_{k}.arrow"), df)
+            meta['trash'].append([[str(c) for c in df.columns], text, raw])
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, default=str)
+        os.replace(tmp, final)
+    except OSError:
+        # 다른 프로세스가 같은 키를 먼저 저장한 경우
+        shutil.rmtree(tmp, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    _evict_results()
+
+def load_result(key):
+    """캐시된 결과 → (cleaned_sheets, trash_list, stats), 없으면 None. 읽을 때마다 최근 사용 시각을 갱신"""
+    path = os.path.join(RESULT_CACHE_DIR, key)
+    try:
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        cleaned_sheets = {}
+        for k, (name, columns, text, raw) in enumerate(meta['sheets']):
+            df = _read_ipc(os.path.join(path, f"clean_{k}.arrow"), columns, text, raw)
+            df.attrs['schema'] = ColumnSchema(df.columns)
+            cleaned_sheets[name] = df
+        trash_list = [_read_ipc(os.path.join(path, f"trash_{k}.arrow"), columns, text, raw)
+                      for k, (columns, text, raw) in enumerate(meta['trash'])]
+        os.utime(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return cleaned_sheets, trash_list, meta['stats']
+
+def _dir_size(path):
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+
+def _evict_results(max_bytes=None):
+    # 최근 사용(mtime) 이 오래된 결과부터 지워 전체 크기를 max_bytes 아래로
+    max_bytes = RESULT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _result_cache_lock:
+        entries = [(e.stat().st_mtime, _dir_size(e.path), e.path) for e in os.scandir(RESULT_CACHE_DIR)
+                   if e.is_dir() and not e.name.startswith('.')]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes: break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+def clear_result_cache():
+    """저장된 정제 결과(참가자 개인정보 포함)를 모두 지운다. 관리자 데이터 초기화 때 함께 호출"""
+    shutil.rmtree(RESULT_CACHE_DIR, ignore_errors=True)
+
+# =====================
+# 메인 파이프라인
+# =====================
+# 시트 병렬 정제를 자동으로 켜는 행 수 합. 이보다 작으면 풀 생성·시트 전송 비용과
+# 워커마다 따로 쓰는 NormalizationCache(시트 간 메모 공유 불가) 때문에 직렬이 더 빠르다
+PARALLEL_MIN_ROWS = 200_000
+
+def sheet_workers(sheets):
+    """(파일 이름, SourceBook, 시트 이름) 목록의 기본 프로세스 수. 행 수 합이 PARALLEL_MIN_ROWS 이상일 때만 CPU 수, 아니면 1"""
+    cpus = os.cpu_count() or 1
+    if len(sheets) < 2 or cpus < 2:
+        return 1
+    counts = [book.row_counts().get(sheet_name) for _, book, sheet_name in sheets]
+    if None in counts or sum(counts) < PARALLEL_MIN_ROWS:
+        return 1
+    return cpus
+
+def copy_on_write(func):
+    """정제 파이프라인 안에서만 pandas copy-on-write 를 켠다 (import 한 쪽의 전역 설정은 그대로).
+    슬라이스·take·reset_index 결과가 데이터를 공유하다가 쓸 때만 복사하므로 방어용 df.copy() 가 필요 없다"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with pd.option_context('mode.copy_on_write', True):
+            return func(*args, **kwargs)
+    return wrapper
+
+@copy_on_write
+def clean_sheet(task, cache=None, row_state=None):
+    """시트 하나를 읽어 정규화와 시트 내 중복 처리까지 한다 (프로세스 풀 작업 단위).
+
+    task = (SourceBook, 시트 이름, lineage, 직전 행 상태, 중복 처리 방식, 정규화 전체 df 반환 여부). 빈 시트는 None.
+    lineage 가 있으면 row_state(없으면 직전 행 상태만 담은 새 RowState)로 증분 정규화한다.
+    """
+    book, sheet_name, lineage, prev_rows, dedup_mode, keep_frame = task
+    df = book.read(sheet_name)
+    if df.empty: return None
+    if lineage is not None and row_state is None:
+        row_state = RowState()
+        if prev_rows is not None:
+            row_state.remember(lineage, prev_rows)
+    if cache is None:
+        cache = NormalizationCache()
+    hits, misses = cache.hits, cache.misses
+    delta = {'new': 0, 'reused': 0, 'removed': 0}
+
+    # 1. 컬럼 역할 감지 (시트당 한 번)
+    schema = ColumnSchema(df.columns)
+
+    # 2. 정규화
+    df = normalize_strings(df, cache, schema, lineage, delta, row_state)
+
+    # 3. 중복 처리 (연락처 정규형의 정수 해시 → entity 단위)
+    key_cols = add_contact_keys(df, schema)
+    df[ENTITY_COL] = resolve_entities(df, key_cols)
+    if dedup_mode == DEDUP_MERGE:
+        clean_df = merge_duplicates(df)
+        trash_df = df.iloc[:0]
+    else:
+        clean_df, trash_df = split_duplicates(df)
+
+    rows = row_state.get(lineage) if lineage is not None else None
+    return {
+        'frame': df if keep_frame else None, 'clean': clean_df, 'trash': trash_df,
+        'schema': schema, 'key_cols': key_cols, 'rows': rows, 'delta': delta,
+        'merged': len(df) - len(clean_df) if dedup_mode == DEDUP_MERGE else 0,
+        'hits': cache.hits - hits, 'misses': cache.misses - misses,
+    }
+
+@copy_on_write
+def run_cleaning_pipeline(uploaded_file, stats=None, dedup_mode=DEDUP_TRASH, global_dedup=False, history_lookup=None,
+                          row_state=None, workers=None, excel=True, sheets=None, use_cache=False):
+    """uploaded_file 은 파일 하나 또는 여러 개의 목록. global_dedup 이면 모든 시트·파일에서 먼저 나온 사람만 남긴다.
+
+    history_lookup(키 해시 배열 → 이전 배치 DataFrame) 을 주면 이전 행사 참가자를 HISTORY_COL 로 표시한다.
+    row_state(RowState) 를 주면 같은 파일의 직전 실행과 내용이 같은 행은 정규화를 건너뛴다 (중복 판별은 항상 전체 행).
+    workers 가 2 이상이고 시트가 여럿이면 시트별 읽기·정제를 프로세스 풀에서 돌린다.
+    workers=None 이면 직렬, 단 고른 시트의 행 수 합(row_counts)이 PARALLEL_MIN_ROWS 이상이면 CPU 수 (sheet_workers).
+    결과는 항상 업로드·시트 순서대로 모아 쓴다. excel=False 면 엑셀 버퍼 대신 None 을 돌려주며,
+    필요할 때 export_dataset 으로 지연 생성한다.
+    파일은 INPUT_TYPES 형식의 파일 객체·경로 또는 SourceBook. sheets 에 (파일 이름, 시트 이름) 목록을 주면 그 시트만 읽는다.
+    use_cache 면 같은 파일·매핑·옵션의 결과를 RESULT_CACHE_DIR 에 저장해 두고 다음에 바로 읽는다 (기본은 끔,
+    DB 를 보는 history_lookup 이 있으면 제외).
+    """
+    files = list(uploaded_file) if isinstance(uploaded_file, (list, tuple)) else [uploaded_file]
+    try:
+        books = [f if isinstance(f, SourceBook) else SourceBook(f, None if hasattr(f, 'name') or isinstance(f, str) else f"file{k + 1}")
+                 for k, f in enumerate(files)]
+        cache_key = None
+        if use_cache and history_lookup is None:
+            cache_key = result_cache_key(books, sheets, dedup_mode=dedup_mode, global_dedup=global_dedup)
+            cached = load_result(cache_key)
+            if cached is not None:
+                cleaned_sheets, trash_list, cached_stats = cached
+                if stats is not None:
+                    stats.update(cached_stats)
+                    stats['result_cache'] = 'hit'
+                output_buffer = None
+                if excel:
+                    output_buffer = io.BytesIO()
+                    write_workbook(output_buffer, cleaned_sheets, trash_list)
+                return output_buffer, cleaned_sheets, trash_list, "Success"
+        wanted = set(sheets) if sheets is not None else None
+        sheets = [(book.name, book, sheet_name) for book in books for sheet_name in book.sheet_names
+                  if wanted is None or (book.name, sheet_name) in wanted]
+        workers = max(min(workers or sheet_workers(sheets), len(sheets)), 1)
+
+        def task(file_name, book, sheet_name):
+            lineage = file_lineage(file_name, sheet_name) if row_state is not None else None
+            prev_rows = row_state.get(lineage) if lineage is not None and workers > 1 else None
+            return book, sheet_name, lineage, prev_rows, dedup_mode, global_dedup
+
+        # 1~3. 시트별 읽기·정규화·시트 내 중복 처리 (map 은 입력 순서대로 결과를 돌려줌)
+        norm_cache = NormalizationCache()
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                results = list(ex.map(clean_sheet, [task(*sheet) for sheet in sheets]))
+        else:
+            results = [clean_sheet(task(*sheet), norm_cache, row_state) for sheet in sheets]
     except Exception as e:
         return None, None, None, str(e)
 
     cleaned_sheets = {}
     trash_list = []
-    output_buffer = io.BytesIO()
+    merged_rows = 0
+    cross_rows = 0
+    returning_rows = 0
+    cache_hits = cache_misses = 0
+    delta = {'new': 0, 'reused': 0, 'removed': 0}
+    key_index = ContactKeyIndex() if global_dedup else None
+    used_labels = set()
+
+    for (file_name, _, sheet_name), res in zip(sheets, results):
+        if res is None: continue
+        # 프로세스 풀에서 만든 상태는 여기서 세션 상태로 옮긴다
+        if row_state is not None and workers > 1 and res['rows'] is not None:
+            row_state.remember(file_lineage(file_name, sheet_name), res['rows'])
+        sheet_name = _sheet_label(file_name, sheet_name, len(books) > 1, used_labels)
+        clean_df, trash_df, schema, key_cols = res['clean'], res['trash'], res['schema'], res['key_cols']
+        merged_rows += res['merged']
+        cache_hits += res['hits']
+        cache_misses += res['misses']
+        for k, v in res['delta'].items():
+            delta[k] += v
+        e_cols = schema.columns_for(ROLE_EMAIL)
+        p_cols = schema.columns_for(ROLE_PHONE)
+        c_cols = schema.columns_for(ROLE_COMPANY)
+
+        # 3-1. 통합 모드: 앞선 시트/파일에 이미 있는 사람은 시트 전체가 휴지통으로
+        if key_index is not None:
+            df = res['frame']
+            hit = key_index.match(df, key_cols)
+            keep_sheet = np.array([sheet_name] * len(hit), dtype=object)
+            keep_sheet[hit >= 0] = [key_index.locations[h][0] for h in hit[hit >= 0]]
+            cross = hit[clean_df[ENTITY_COL].to_numpy()] >= 0
+            cross_rows += int(cross.sum())
+            trash_df = pd.concat([trash_df, clean_df.take(np.flatnonzero(cross))])
+            clean_df = clean_df.take(np.flatnonzero(~cross))
+            trash_df.insert(0, KEEP_SHEET_COL, keep_sheet[trash_df[ENTITY_COL].to_numpy()])
+            key_index.register(df, key_cols, sheet_name,
+                               pd.Series(clean_df.index, index=clean_df[ENTITY_COL].to_numpy()))
+        
+        if not trash_df.empty:
+            trash_df.insert(0, '[원본시트]', sheet_name)
+            trash_df = drop_key_columns(trash_df)
+            trash_list.append(trash_df)
+        
+        # 3-2. 이전 행사 참가 이력 (DB 키 색인 조회)
+        if history_lookup is not None:
+            returning_rows += flag_returning_contacts(clean_df, key_cols, history_lookup)
+        
+        # 4. 마무리
+        clean_df = drop_key_columns(clean_df)
+        clean_df = flag_missing_info(clean_df, e_cols, p_cols, c_cols)
+        clean_df = remove_sequence_columns(clean_df)
+        clean_df = clean_df.reset_index(drop=True)
+        clean_df.index += 1
+        clean_df.attrs['schema'] = ColumnSchema(clean_df.columns, base=schema)
+        clean_df = apply_column_types(clean_df)
+        
+        cleaned_sheets[sheet_name] = clean_df
+
+    # 5. 엑셀 (excel=False 면 필요할 때 export_dataset 으로)
+    output_buffer = None
+    if excel:
+        output_buffer = io.BytesIO()
+        write_workbook(output_buffer, cleaned_sheets, trash_list)
+
+    # 호출 측에서 dict를 넘기면 처리 통계를 채워줌
+    if stats is not None:
+        stats['cache_hits'] = cache_hits
+        stats['cache_misses'] = cache_misses
+        stats['cache_hit_ratio'] = cache_hits / (cache_hits + cache_misses) if cache_hits + cache_misses else 0.0
+        stats['workers'] = workers
+        stats['dedup_mode'] = dedup_mode
+        stats['merged_rows'] = merged_rows
+        stats['cross_sheet_rows'] = cross_rows
+        stats['returning_rows'] = returning_rows
+        stats['delta_new_rows'] = delta['new']
+        stats['delta_reused_rows'] = delta['reused']
+        stats['delta_removed_rows'] = delta['removed']
+
+    if cache_key is not None:
+        try:
+            save_result(cache_key, cleaned_sheets, trash_list, {
+                'dedup_mode': dedup_mode, 'merged_rows': merged_rows, 'cross_sheet_rows': cross_rows,
+            })
+        except Exception:
+            pass  # 캐시 저장 실패는 정제 결과에 영향 없음
+        if stats is not None:
+            stats['result_cache'] = 'miss'
+
+    return output_buffer, cleaned_sheets, trash_list, "Success"
+
+# =====================
+# 내보내기 (요청 시 생성, 임시 파일 캐시)
+# =====================
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'data_cleaner_exports')
+EXPORT_CACHE_MAX = 16
+HEADER_FORMAT = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+
+_export_lock = threading.Lock()
+_export_cache = {}  # (dataset 버전, 마스킹 여부, 형식) → 파일 경로, 삽입 순서 = 최근 사용 순
+MASK_CACHE_MAX = 4
+_mask_cache = {}  # dataset 버전 → 마스킹한 시트들, 형식이 달라도 한 번만 가린다
+
+def _new_workbook(target):
+    # 경로면 constant_memory 로 행마다 임시 파일에 흘려 쓰고, BytesIO 면 메모리에서 조립
+    opts = {'constant_memory': True, 'nan_inf_to_errors': True, 'default_date_format': 'yyyy-mm-dd hh:mm:ss'}
+    if not isinstance(target, str):
+        opts['in_memory'] = True
+    book = xlsxwriter.Workbook(target, opts)
+    return book, book.add_format(HEADER_FORMAT)
+
+EXPORT_WRITE_ROWS = 5000  # 파이썬 값으로 바꿔 둘 행 묶음 크기
+
+def _write_rows(ws, df, start):
+    # xlsxwriter constant_memory 는 행 순서대로만 쓸 수 있으므로 한 행씩 (결측은 빈 칸).
+    # 시트 전체를 한 번에 리스트로 만들지 않고 EXPORT_WRITE_ROWS 행씩 변환
+    for pos in range(0, len(df), EXPORT_WRITE_ROWS):
+        part = df.iloc[pos:pos + EXPORT_WRITE_ROWS]
+        for k, row in enumerate(part.astype(object).where(part.notna(), None).to_numpy().tolist()):
+            ws.write_row(start + pos + k, 0, row)
+    return start + len(df)
+
+XLSX_MAX_ROWS = 1_048_576  # 엑셀 시트 한 장의 최대 행 수 (머리글 포함)
+
+class SheetAppender:
+    """시트 하나에 행을 이어 쓴다. 엑셀 행 한도를 넘으면 '<이름>_2', '<이름>_3' … 새 시트에 머리글부터 이어 쓴다
+    (xlsxwriter 는 한도 밖 행을 오류 없이 버리므로 여기서 나눈다)"""
+
+    def __init__(self, book, header, name, columns, used=None):
+        self.book, self.header = book, header
+        self.columns = [str(c) for c in columns]
+        self.used = used if used is not None else {name}
+        self.names = []
+        self.counts = {}  # 시트 이름 → 데이터 행 수
+        self.rows = 0     # 모든 시트에 쓴 데이터 행 수
+        self._open(name)
+
+    @staticmethod
+    def capacity():
+        return XLSX_MAX_ROWS - 1
+
+    def _open(self, name):
+        self.used.add(name)
+        self.ws = self.book.add_worksheet(name)
+        self.ws.write_row(0, 0, self.columns, self.header)
+        self.names.append(name)
+        self.counts[name] = 0
+
+    def sheet_of(self, row):
+        # 이어 쓴 순서의 데이터 행 번호(1부터) → 그 행이 있는 시트 이름
+        return self.names[(row - 1) // self.capacity()]
+
+    def write(self, df):
+        cap = self.capacity()
+        pos = 0
+        while pos < len(df):
+            used = self.counts[self.names[-1]]
+            if used == cap:
+                suffix = f"_{len(self.names) + 1}"
+                self._open(_sheet_label(None, self.names[0][:31 - len(suffix)] + suffix, False, self.used))
+                used = 0
+            take = min(cap - used, len(df) - pos)
+            _write_rows(self.ws, df.iloc[pos:pos + take], used + 1)
+            self.counts[self.names[-1]] = used + take
+            self.rows += take
+            pos += take
+        return self.rows
+
+def _write_sheet(book, header, name, df, used=None):
+    return SheetAppender(book, header, name, df.columns, used).write(df)
+
+def _export_frame(df, masked):
+    # 내보낼 때만 상태 비트를 라벨로
+    return render_status(mask_personal_info(df) if masked else df)
+
+def write_workbook(target, cleaned_sheets, trash_list=None, masked=False):
+    """정제 시트와 휴지통(원본 시트별)을 target(경로 또는 BytesIO) 엑셀로 쓴다. masked 면 시트별로 마스킹하고 휴지통은 뺀다"""
+    book, header = _new_workbook(target)
+    used = set(cleaned_sheets)
+    for name, df in cleaned_sheets.items():
+        _write_sheet(book, header, name, _export_frame(df, masked), used)
+    if trash_list and not masked:
+        full_trash = pd.concat(trash_list)
+        for origin, group in full_trash.groupby('[원본시트]'):
+            safe_name = re.sub(r'[^\w]', '', origin)[:15]
+            _write_sheet(book, header, f"휴지통_{safe_name}", group.dropna(axis=1, how='all'), used)
+    book.close()
+
+# 컬럼형 형식: 시트마다 파일 하나씩 zip 으로 묶는다 (휴지통은 [원본시트] 컬럼을 가진 파일 하나)
+EXPORT_CSV_CHUNK = 50000
+EXPORT_TRASH_NAME = '휴지통'
+
+def _arrow_table(df, dictionary=False):
+    """DataFrame → pyarrow Table. 타입이 섞인 object 컬럼은 문자열로, dictionary 면 반복이 많은 문자열 컬럼을 사전 인코딩"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    arrays = []
+    for i in range(df.shape[1]):
+        s = df.iloc[:, i]
+        try:
+            arr = pa.array(s, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arr = pa.array([None if _is_null(x) else str(x) for x in s], type=pa.string())
+        if dictionary and pa.types.is_string(arr.type) and len(arr) and pc.count_distinct(arr).as_py() * 2 <= len(arr):
+            arr = arr.dictionary_encode()
+        arrays.append(arr)
+    return pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+
+def _parquet_bytes(df):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = _arrow_table(df)
+    buf = io.BytesIO()
+    string_cols = [f.name for f in table.schema if pa.types.is_string(f.type)]
+    pq.write_table(table, buf, use_dictionary=string_cols, compression='zstd')
+    return buf.getvalue()
+
+def _arrow_bytes(df):
+    import pyarrow as pa
+    table = _arrow_table(df, dictionary=True)
+    buf = io.BytesIO()
+    with pa.ipc.new_file(buf, table.schema, options=pa.ipc.IpcWriteOptions(compression='zstd')) as w:
+        w.write_table(table, max_chunksize=EXPORT_CSV_CHUNK)
+    return buf.getvalue()
 
-    with pd.ExcelWriter(output_buffer, engine='xlsxwriter') as writer:
-        for sheet_name, df in sheets.items():
+def _csv_gz_bytes(df):
+    # 청크 단위로 gzip 스트림에 이어 쓴다 (헤더는 첫 청크만)
+    import gzip
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) as gz:
+        with io.TextIOWrapper(gz, encoding='utf-8', newline='') as fh:
+            for start in range(0, max(len(df), 1), EXPORT_CSV_CHUNK):
+                df.iloc[start:start + EXPORT_CSV_CHUNK].to_csv(fh, header=start == 0, index=False)
+    return buf.getvalue()
+
+def _bundle_writer(ext, to_bytes):
+    def write(target, cleaned_sheets, trash_list=None, masked=False):
+        import zipfile
+        with zipfile.ZipFile(target, 'w', zipfile.ZIP_STORED) as zf:
+            for name, df in cleaned_sheets.items():
+                zf.writestr(f"{name}{ext}", to_bytes(_export_frame(df, masked)))
+            if trash_list and not masked:
+                zf.writestr(f"{EXPORT_TRASH_NAME}{ext}", to_bytes(pd.concat(trash_list)))
+    return write
+
+EXPORT_WRITERS = {
+    'xlsx': ('.xlsx', write_workbook),
+    'parquet': ('.parquet.zip', _bundle_writer('.parquet', _parquet_bytes)),
+    'arrow': ('.arrow.zip', _bundle_writer('.arrow', _arrow_bytes)),
+    'csv': ('.csv.gz.zip', _bundle_writer('.csv.gz', _csv_gz_bytes)),
+}
+
+def clear_exports():
+    """만들어 둔 내보내기 파일과 마스킹 캐시를 지운다"""
+    with _export_lock:
+        for path in _export_cache.values():
+            if os.path.exists(path): os.remove(path)
+        _export_cache.clear()
+        _mask_cache.clear()
+
+def masked_sheets(cleaned_sheets, version):
+    """시트별 mask_personal_info 결과. 같은 version 이면 다시 가리지 않고 캐시를 돌려준다"""
+    with _export_lock:
+        sheets = _mask_cache.pop(version, None)
+        if sheets is not None:
+            _mask_cache[version] = sheets
+            return sheets
+    sheets = {name: mask_personal_info(df) for name, df in cleaned_sheets.items()}
+    with _export_lock:
+        _mask_cache[version] = sheets
+        while len(_mask_cache) > MASK_CACHE_MAX:
+            _mask_cache.pop(next(iter(_mask_cache)))
+    return sheets
+
+def export_dataset(cleaned_sheets, trash_list, version, masked=False, fmt='xlsx'):
+    """결과를 fmt 형식 임시 파일로 내보내고 경로를 반환. (version, masked, fmt) 가 같으면 만든 파일을 재사용한다.
+
+    version 은 호출 측이 데이터가 바뀔 때마다 새로 매기는 값 (복구 등으로 시트가 바뀌면 다른 파일).
+    """
+    key = (version, masked, fmt)
+    with _export_lock:
+        path = _export_cache.pop(key, None)
+        if path is not None and os.path.exists(path):
+            _export_cache[key] = path
+            return path
+    suffix, writer = EXPORT_WRITERS[fmt]
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=EXPORT_DIR)
+    os.close(fd)
+    try:
+        if masked:
+            # 마스킹본은 휴지통을 빼고 버전별로 캐시된 시트를 그대로 쓴다
+            writer(path, masked_sheets(cleaned_sheets, version), None, False)
+        else:
+            writer(path, cleaned_sheets, trash_list, False)
+    except Exception:
+        os.remove(path)
+        raise
+    with _export_lock:
+        _export_cache[key] = path
+        while len(_export_cache) > EXPORT_CACHE_MAX:
+            old = _export_cache.pop(next(iter(_export_cache)))
+            if os.path.exists(old): os.remove(old)
+    return path
+
+# =====================
+# 스트리밍(대용량) 모드: 청크 단위 읽기·정제·쓰기
+# =====================
+STREAM_CHUNK_ROWS = 20000
+SPILL_KEYS = 1_000_000
+STREAM_MEMO_ENTRIES = 50000  # 청크 사이에 들고 갈 역할별 정규화 메모 상한
+
+def _chunk_frame(rows, columns):
+    # 빈 셀(None)과 'NULL', '#N/A' 같은 결측 문자열은 read_excel 처럼 NaN 으로
+    # (정규화 함수가 None 을 'none' 문자열로 만들거나 'NULL' 끼리 같은 사람으로 묶지 않도록)
+    arr = np.array(rows, dtype=object).reshape(len(rows), len(columns))
+    arr[np.equal(arr, None)] = np.nan
+    df = pd.DataFrame(arr, columns=columns)
+    return df.mask(df.isin(list(READ_NA_VALUES)))
+
+def _csv_encoding(source, probe=1 << 20):
+    # 앞부분(마지막 줄바꿈까지)을 디코딩해 보고 CSV_ENCODINGS 중 처음 맞는 인코딩
+    if hasattr(source, 'read'):
+        pos = source.tell()
+        head = source.read(probe)
+        source.seek(pos)
+    else:
+        with open(source, 'rb') as fh:
+            head = fh.read(probe)
+    if len(head) == probe and b'\n' in head:
+        head = head[:head.rindex(b'\n')]
+    for enc in CSV_ENCODINGS:
+        try:
+            head.decode(enc)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return CSV_ENCODINGS[-1]
+
+def iter_sheet_chunks(source, chunk_rows=STREAM_CHUNK_ROWS):
+    """openpyxl read-only 로 시트를 한 행씩 읽어 (시트 이름, 청크 DataFrame) 을 chunk_rows 행씩 내보낸다.
+    csv 는 read_csv(chunksize), parquet 는 행 그룹 배치 단위로 읽는다 (시트 이름 = 파일 이름)."""
+    name = getattr(source, 'name', source)
+    kind = _file_kind(name)
+    if kind in ('csv', 'parquet'):
+        stem = os.path.splitext(os.path.basename(str(name)))[0]
+        if kind == 'csv':
+            for df in pd.read_csv(source, dtype=object, encoding=_csv_encoding(source), chunksize=chunk_rows):
+                yield stem, df
+        else:
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_rows):
+                yield stem, batch.to_pandas().astype(object)
+        return
+    import openpyxl
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None: continue
+            # pd.read_excel 과 같은 헤더 (빈 칸은 'Unnamed: k', 겹치면 '.1' 접미사)
+            names, seen = [], {}
+            for k, h in enumerate(header):
+                h = f"Unnamed: {k}" if h is None else h
+                if h in seen:
+                    seen[h] += 1
+                    h = f"{h}.{seen[h]}"
+                seen.setdefault(h, 0)
+                names.append(h)
+            buf = []
+            for row in rows:
+                buf.append(row)
+                if len(buf) >= chunk_rows:
+                    yield ws.title, _chunk_frame(buf, names)
+                    buf = []
+            if buf:
+                yield ws.title, _chunk_frame(buf, names)
+    finally:
+        wb.close()
+
+class SpillKeyIndex:
+    """연락처 키 해시 → 처음 등록된 위치 번호. spill_at 개를 넘으면 임시 SQLite 파일로 내려 메모리를 묶어 둔다"""
+
+    def __init__(self, spill_at=SPILL_KEYS):
+        self.spill_at = spill_at
+        self.memory = {}
+        self.conn = None
+        self.spilled = 0
+
+    def lookup(self, hashes):
+        """hashes(uint64 배열) 의 위치 번호 (없으면 -1)"""
+        loc = pd.Series(hashes).map(self.memory).fillna(-1).to_numpy(dtype=np.int64)
+        if self.conn is not None and (loc < 0).any():
+            miss = np.unique(hashes[loc < 0])
+            found = {}
+            for k in range(0, len(miss), 900):
+                part = miss[k:k + 900].view(np.int64).tolist()
+                q = f"SELECT key_hash, loc FROM keys WHERE key_hash IN ({','.join('?' * len(part))})"
+                found.update(self.conn.execute(q, part).fetchall())
+            if found:
+                disk = pd.Series(hashes[loc < 0].view(np.int64)).map(found).fillna(-1).to_numpy(dtype=np.int64)
+                loc[loc < 0] = disk
+        return loc
+
+    def add(self, hashes, locs):
+        # 먼저 등록된 위치가 이긴다 (호출 측에서 lookup 으로 걸러진 새 키만 넘김)
+        for h, l in zip(hashes.tolist(), locs.tolist()):
+            self.memory.setdefault(h, l)
+        if len(self.memory) > self.spill_at:
+            self._spill()
+
+    def _spill(self):
+        if self.conn is None:
+            self._file = tempfile.NamedTemporaryFile(suffix='.keys.db', delete=False)
+            self._file.close()
+            self.conn = sqlite3.connect(self._file.name)
+            self.conn.execute("PRAGMA journal_mode=OFF")
+            self.conn.execute("PRAGMA synchronous=OFF")
+            self.conn.execute("CREATE TABLE keys (key_hash INTEGER PRIMARY KEY, loc INTEGER)")
+        hashes = np.fromiter(self.memory.keys(), dtype=np.uint64, count=len(self.memory)).view(np.int64)
+        self.conn.executemany("INSERT OR IGNORE INTO keys VALUES (?, ?)", zip(hashes.tolist(), self.memory.values()))
+        self.conn.commit()
+        self.spilled += len(self.memory)
+        self.memory = {}
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            os.unlink(self._file.name)
+            self.conn = None
+
+@copy_on_write
+def run_streaming_pipeline(source, output_path, stats=None, dedup_mode=DEDUP_TRASH, global_dedup=False,
+                           history_lookup=None, chunk_rows=STREAM_CHUNK_ROWS, spill_at=SPILL_KEYS):
+    """메모리보다 큰 통합 명단용: chunk_rows 행씩 읽어 정제하고 output_path 엑셀에 바로 이어 쓴다.
+    source 는 파일(경로 또는 파일 객체) 하나 또는 목록이며 시트 이름은 run_cleaning_pipeline 과 같다.
+
+    최대 메모리는 파일 크기가 아니라 청크 크기(+ spill_at 개의 키)에 묶인다. 중복 판별은 청크 안에서는
+    run_cleaning_pipeline 과 같고, 앞선 청크와 겹치는 행은 이미 기록된 행을 남기고 휴지통으로 보낸다
+    (병합 모드에서도 이미 쓴 행은 고칠 수 없으므로 휴지통). 휴지통 행은 임시 파일에 모았다가 끝에 쓴다.
+    반환: (output_path, 시트별 정제 행 수, 시트별 휴지통 행 수, 메시지)
+    """
+    book, header = _new_workbook(output_path)
+    norm_cache = NormalizationCache()
+    key_index = SpillKeyIndex(spill_at)
+    clean_counts, trash_counts = {}, {}
+    trash_spill = {}
+    sheets = {}
+    used_labels = set()
+    merged_rows = cross_rows = returning_rows = spilled = 0
+    files = list(source) if isinstance(source, (list, tuple)) else [source]
+    chunks = ((k, getattr(f, 'name', f if isinstance(f, str) else f"file{k + 1}"), sn, df)
+              for k, f in enumerate(files) for sn, df in iter_sheet_chunks(f, chunk_rows))
+    try:
+        for file_no, file_name, raw_name, df in chunks:
+            if (file_no, raw_name) not in sheets:
+                if not global_dedup and sheets:
+                    spilled += key_index.spilled
+                    key_index.close()
+                    key_index = SpillKeyIndex(spill_at)
+                sheets[(file_no, raw_name)] = {
+                    'no': len(sheets), 'out': None, 'row': 1, 'read': 0, 'schema': ColumnSchema(df.columns),
+                    'label': _sheet_label(file_name, raw_name, len(files) > 1, used_labels),
+                }
+            sheet = sheets[(file_no, raw_name)]
+            sheet_name = sheet['label']
+            schema = sheet['schema']
+            # 원본 행 번호가 청크를 넘어 이어지도록
+            df.index = pd.RangeIndex(sheet['read'], sheet['read'] + len(df))
+            sheet['read'] += len(df)
+            df = normalize_strings(df, norm_cache, schema)
             if df.empty: continue
-            
-            # 1. 정규화
-            df = normalize_strings(df)
-            
-            # 2. 컬럼 감지
-            e_cols = get_columns_by_keywords(df, EMAIL_KEYWORDS)
-            p_cols = get_columns_by_keywords(df, PHONE_KEYWORDS)
-            c_cols = get_columns_by_keywords(df, COMPANY_KEYWORDS)
-            
-            # 3. 중복 제거
-            df['_SCORE'] = df.notna().sum(axis=1)
-            df = df.sort_values('_SCORE', ascending=False)
-            
-            delete_mask = pd.Series([False]*len(df), index=df.index)
-            for col_group in [e_cols, p_cols]:
-                for c in col_group:
-                    valid = df[c].astype(str).str.len() > 3
-                    delete_mask |= (valid & df.duplicated(subset=[c], keep='first'))
-            
-            trash_df = df[delete_mask].copy()
-            clean_df = df[~delete_mask].copy()
-            
+
+            # 청크 안 중복 처리
+            key_cols = add_contact_keys(df, schema)
+            df[ENTITY_COL] = resolve_entities(df, key_cols)
+            if dedup_mode == DEDUP_MERGE:
+                clean_df = merge_duplicates(df)
+                trash_df = df.iloc[:0]
+                merged_rows += len(df) - len(clean_df)
+            else:
+                clean_df, trash_df = split_duplicates(df)
+
+            # 앞선 청크(시트)에 이미 쓴 사람: 위치 번호 = 시트 번호 << 32 | 엑셀 행 번호
+            hashes, entity = _entity_keys(df, key_cols)
+            n_entities = int(df[ENTITY_COL].max()) + 1
+            hit = np.full(n_entities, -1, dtype=np.int64)
+            loc = key_index.lookup(hashes)
+            found = loc >= 0
+            if found.any():
+                first = pd.Series(loc[found]).groupby(entity[found]).min()
+                hit[first.index.to_numpy()] = first.to_numpy()
+            cross = hit[clean_df[ENTITY_COL].to_numpy()] >= 0
+            cross_rows += int(cross.sum())
+            if cross.any():
+                trash_df = pd.concat([trash_df, clean_df.take(np.flatnonzero(cross))])
+                clean_df = clean_df.take(np.flatnonzero(~cross))
+            own = np.full(n_entities, -1, dtype=np.int64)
+            own[clean_df[ENTITY_COL].to_numpy()] = (sheet['no'] << 32) + sheet['row'] + np.arange(len(clean_df))
+            kept_at = np.where(hit >= 0, hit, own)
+            new = ~found
+            key_index.add(hashes[new], kept_at[entity[new]])
+
+            if history_lookup is not None:
+                returning_rows += flag_returning_contacts(clean_df, key_cols, history_lookup)
+
+            out = drop_key_columns(clean_df)
+            out = flag_missing_info(out, schema.columns_for(ROLE_EMAIL), schema.columns_for(ROLE_PHONE),
+                                    schema.columns_for(ROLE_COMPANY))
+            out = remove_sequence_columns(out)
+            if sheet['out'] is None:
+                sheet['out'] = SheetAppender(book, header, sheet_name, out.columns, used_labels)
+            sheet['row'] = sheet['out'].write(render_status(out)) + 1
+
             if not trash_df.empty:
+                # 유지 시트는 통합 모드에서만 (시트별 모드는 메모리 파이프라인과 같은 컬럼).
+                # 남긴 행이 행 한도로 넘어간 시트('_2' …)에 있으면 그 시트 이름
+                if global_dedup:
+                    by_no = {v['no']: v['out'] for v in sheets.values() if v['out'] is not None}
+                    keep = [by_no[l >> 32].sheet_of(l & 0xFFFFFFFF)
+                            for l in kept_at[trash_df[ENTITY_COL].to_numpy()].tolist()]
+                    trash_df.insert(0, KEEP_SHEET_COL, keep)
                 trash_df.insert(0, '[원본시트]', sheet_name)
-                if '_SCORE' in trash_df.columns: trash_df = trash_df.drop(columns=['_SCORE'])
-                trash_list.append(trash_df)
-            
-            # 4. 마무리
-            clean_df = flag_missing_info(clean_df, e_cols, p_cols, c_cols)
-            clean_df = remove_sequence_columns(clean_df)
-            if '_SCORE' in clean_df.columns: clean_df = clean_df.drop(columns=['_SCORE'])
-            clean_df = clean_df.reset_index(drop=True)
-            clean_df.index += 1
-            
-            cleaned_sheets[sheet_name] = clean_df
-            clean_df.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-        if trash_list:
-            full_trash = pd.concat(trash_list)
-            for origin, group in full_trash.groupby('[원본시트]'):
-                safe_name = re.sub(r'[^\w]', '', origin)[:15]
-                group.dropna(axis=1, how='all').to_excel(writer, sheet_name=f"휴지통_{safe_name}", index=False)
-                
-    return output_buffer, cleaned_sheets, trash_list, "Success"
\ No newline at end of file
+                if sheet_name not in trash_spill:
+                    trash_spill[sheet_name] = tempfile.TemporaryFile()
+                pickle.dump(drop_key_columns(trash_df), trash_spill[sheet_name])
+                trash_counts[sheet_name] = trash_counts.get(sheet_name, 0) + len(trash_df)
+
+            # 정규화 메모는 청크 사이에 상한까지만 들고 간다 (고유값이 많은 명단에서 메모가 끝없이 자라지 않도록)
+            norm_cache.trim(STREAM_MEMO_ENTRIES)
+
+        # 휴지통: 시트별 임시 파일에서 청크를 다시 읽어 이어 쓴다 (청크마다 컬럼이 같음)
+        for origin, spill in trash_spill.items():
+            spill.seek(0)
+            safe_name = re.sub(r'[^\w]', '', origin)[:15]
+            writer = None
+            while True:
+                try:
+                    part = pickle.load(spill)
+                except EOFError:
+                    break
+                if writer is None:
+                    writer = SheetAppender(book, header, f"휴지통_{safe_name}", part.columns, used_labels)
+                writer.write(part)
+        for sheet in sheets.values():
+            if sheet['out'] is not None:
+                clean_counts.update(sheet['out'].counts)
+        book.close()
+    except Exception as e:
+        return None, None, None, str(e)
+    finally:
+        key_index.close()
+        for spill in trash_spill.values():
+            spill.close()
+
+    if stats is not None:
+        stats['cache_hits'] = norm_cache.hits
+        stats['cache_misses'] = norm_cache.misses
+        stats['cache_hit_ratio'] = norm_cache.hit_ratio
+        stats['memo_entries'] = norm_cache.entries
+        stats['dedup_mode'] = dedup_mode
+        stats['merged_rows'] = merged_rows
+        stats['cross_sheet_rows'] = cross_rows
+        stats['returning_rows'] = returning_rows
+        stats['spilled_keys'] = spilled + key_index.spilled
+
+    return output_path, clean_counts, trash_counts, "Success"
@@ -3,6 +3,8 @@ from sqlalchemy import create_engine, inspect, text, MetaData
 from datetime import datetime
 import os
 import re
+import numpy as np
+from modules import cleaner
 
 # DB 설정
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -20,13 +22,12 @@ def save_to_db(cleaned_sheets, batch_name):
     upload_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     saved_tables = []
     try:
+        init_key_table()
         for sheet_name, df in cleaned_sheets.items():
-            save_df = df.copy()
-            save_df['meta_filename'] = batch_name
-            save_df['meta_processed_at'] = upload_time
-            save_df = save_df.astype(str)
+            save_df = cleaner.render_status(df).assign(meta_filename=batch_name, meta_processed_at=upload_time).astype(str)
             table_name = sanitize_table_name(sheet_name)
             save_df.to_sql(table_name, con=engine, if_exists='append', index=False)
+            index_contact_keys(df, table_name, batch_name)
             saved_tables.append(table_name)
         return True, f"저장 완료 ({len(saved_tables)}개 테이블)"
     except Exception as e:
@@ -35,7 +36,7 @@ def save_to_db(cleaned_sheets, batch_name):
 def get_table_names():
     try:
         tables = inspect(engine).get_table_names()
-        return [t for t in tables if t != 'qna_board' and t != 'sqlite_sequence']
+        return [t for t in tables if t not in ('qna_board', 'sqlite_sequence', KEY_TABLE)]
     except: return []
 
 def execute_query(query):
@@ -56,6 +57,74 @@ def clear_database():
     except Exception as e:
         return False, str(e)
 
+# --- 연락처 키 색인 (재방문 참가자 조회용) ---
+KEY_TABLE = 'contact_keys'
+KEY_LOOKUP_CHUNK = 900  # SQLite 바인딩 변수 개수 제한 안쪽
+
+def init_key_table():
+    """연락처 키 해시 → (테이블, 배치, 행) 색인 테이블 생성. 처음 만들 때 기존 history 테이블을 한 번 색인"""
+    created = KEY_TABLE not in inspect(engine).get_table_names()
+    with engine.connect() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {KEY_TABLE} (
+                key_hash INTEGER NOT NULL,
+                kind TEXT,
+                table_name TEXT,
+                batch TEXT,
+                row_no INTEGER
+            )
+        """))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{KEY_TABLE}_hash ON {KEY_TABLE} (key_hash)"))
+        conn.commit()
+    if created:
+        rebuild_key_index()
+
+def index_contact_keys(df, table_name, batch_name):
+    """정제된 시트의 이메일/전화번호 키 해시를 색인 테이블에 추가"""
+    keys = cleaner.contact_key_frame(df)
+    if keys.empty: return 0
+    init_key_table()
+    keys['key_hash'] = keys['key_hash'].to_numpy(dtype=np.uint64).view(np.int64)  # SQLite INTEGER 는 부호 있는 64비트
+    keys['table_name'] = table_name
+    keys['batch'] = batch_name
+    keys.to_sql(KEY_TABLE, con=engine, if_exists='append', index=False)
+    return len(keys)
+
+def rebuild_key_index():
+    """history 테이블 전체를 다시 읽어 색인을 새로 만든다 (색인 도입 전에 저장된 배치용)"""
+    with engine.connect() as conn:
+        conn.execute(text(f"DELETE FROM {KEY_TABLE}"))
+        conn.commit()
+    for table_name in inspect(engine).get_table_names():
+        if not table_name.startswith('history_'): continue
+        hist = pd.read_sql(text(f'SELECT * FROM "{table_name}"'), con=engine)
+        if hist.empty or 'meta_filename' not in hist.columns: continue
+        # astype(str) 로 저장된 빈 값 되돌리기
+        hist = hist.replace(list(cleaner.NULL_TOKENS) + ['<NA>'], pd.NA)
+        hist.index = hist.groupby('meta_filename').cumcount() + 1
+        for batch_name, part in hist.groupby('meta_filename', sort=False):
+            index_contact_keys(part.drop(columns=['meta_filename', 'meta_processed_at'], errors='ignore'),
+                               table_name, batch_name)
+
+def find_returning_contacts(key_hashes):
+    """키 해시 목록 중 이전 배치에 있던 것을 인덱스로 조회 → DataFrame(key_hash, kind, table_name, batch, row_no)"""
+    init_key_table()
+    probe = np.unique(np.asarray(key_hashes, dtype=np.uint64).view(np.int64))
+    frames = []
+    with engine.connect() as conn:
+        for s in range(0, len(probe), KEY_LOOKUP_CHUNK):
+            params = {f"k{i}": int(v) for i, v in enumerate(probe[s:s + KEY_LOOKUP_CHUNK])}
+            placeholders = ", ".join(f":{k}" for k in params)
+            frames.append(pd.read_sql(text(f"""
+                SELECT key_hash, kind, table_name, batch, row_no FROM {KEY_TABLE}
+                WHERE key_hash IN ({placeholders})
+            """), con=conn, params=params))
+    if not frames:
+        return pd.DataFrame(columns=['key_hash', 'kind', 'table_name', 'batch', 'row_no'])
+    found = pd.concat(frames, ignore_index=True)
+    found['key_hash'] = found['key_hash'].to_numpy(dtype=np.int64).view(np.uint64)
+    return found
+
 # --- [NEW] Q&A 게시판 관련 함수 (업그레이드됨) ---
 
 def init_qna_table():
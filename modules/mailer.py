@@ -11,7 +11,8 @@ def force_clean_input(text):
     """
     [긴급 패치] 사용자 입력값(이메일, 비번 등)에 섞인 유령 문자(\xa0) 박멸
     """
-    if not text:
+    # 정제된 시트의 빈 칸은 pd.NA (bool 판정이 안 되므로 먼저 거른다)
+    if text is None or pd.isna(text) or not text:
         return ""
     
     text = str(text)
@@ -41,6 +42,7 @@ def send_bulk_emails(df, sender_email, sender_pw, email_col, subject, body_col,
     clean_sender_pw = force_clean_input(sender_pw) # 비밀번호에도 공백이 묻어올 수 있음
     clean_subject = force_clean_input(subject)
 
+    server = None
     try:
         # SMTP 서버 연결
         server = smtplib.SMTP_SSL(smtp_server, smtp_port)
@@ -93,5 +95,7 @@ def send_bulk_emails(df, sender_email, sender_pw, email_col, subject, body_col,
         return True, success_count, fail_count, error_log
 
     except Exception as e:
-        # 로그인 실패 등 치명적 오류
+        # 로그인 실패 등 치명적 오류 (열린 연결은 닫아 둔다)
+        if server is not None:
+            server.close()
         return False, 0, 0, [f"SMTP 오류: {str(e)}"]
\ No newline at end of file
@@ -36,6 +36,8 @@ def create_pdf_report(stats, cleaned_data):
     pdf.cell(0, 8, f"- Valid Data: {stats['total_rows'] - stats['removed_rows']}", ln=True)
     pdf.cell(0, 8, f"- Duplicates Removed: {stats['removed_rows']}", ln=True)
     pdf.cell(0, 8, f"- Rows with Missing Info: {stats['missing_info_rows']}", ln=True)
+    for label, n in stats.get('missing_by_flag', {}).items():
+        pdf.cell(0, 8, f"    · {label}: {n}", ln=True)
     pdf.ln(10)
 
     pdf.set_font(body_font, 'B', 14)
@@ -0,0 +1,43 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from modules import cleaner
+
+
+def _run(buf, name):
+    buf.seek(0)
+    buf.name = name
+    _, clean, _, msg = cleaner.run_cleaning_pipeline(buf, excel=False, use_cache=False)
+    assert msg == "Success"
+    return next(iter(clean.values()))
+
+
+def _rating_frame():
+    return pd.DataFrame({
+        '이름': ['a', 'b', 'c', 'd'],
+        '이메일': ['a@x.com', 'b@x.com', 'c@x.com', 'd@x.com'],
+        '평점': [7, 9, None, 10],
+    })
+
+
+def test_rating_is_numeric_from_xlsx():
+    buf = io.BytesIO()
+    _rating_frame().to_excel(buf, index=False)
+    out = _run(buf, 'rating.xlsx')
+    assert out['평점'].dtype in (np.float64, pd.Int64Dtype())
+    assert out['평점'].tolist()[:2] == [7, 9]
+
+
+def test_rating_is_numeric_from_csv():
+    buf = io.BytesIO(_rating_frame().to_csv(index=False).encode('utf-8'))
+    out = _run(buf, 'rating.csv')
+    assert out['평점'].dtype in (np.float64, pd.Int64Dtype())
+
+
+def test_text_rating_values_are_parsed():
+    df = pd.DataFrame({'평점': pd.Series(['7', '9', None], dtype=object), '이름': pd.Series(['a', 'b', 'c'], dtype=object)})
+    out = cleaner.apply_column_types(df)
+    assert out['평점'].dtype == np.float64
+    assert out['이름'].dtype == cleaner.TEXT_DTYPE
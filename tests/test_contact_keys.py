@@ -0,0 +1,51 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from modules import cleaner
+
+
+def test_canonical_phone_korean_forms_are_equal():
+    s = pd.Series(['010-1234-5678', '+82 10 1234 5678', '01012345678', '+82 010-1234-5678',
+                   '0082-10-1234-5678', '821012345678', 1012345678], dtype=object)
+    assert cleaner.canonical_phone(s).tolist() == ['+821012345678'] * len(s)
+
+
+def test_canonical_phone_foreign_and_missing():
+    s = pd.Series(['+1 (415) 555-0100', '123', None, np.nan], dtype=object)
+    out = cleaner.canonical_phone(s)
+    assert out[0] == '+14155550100'
+    assert out[1:].isna().all()
+
+
+def test_canonical_email():
+    s = pd.Series([' John.Doe+news@GMAIL.com', 'johndoe@googlemail.com', 'a.b+x@outlook.com',
+                   'a.b+x@naver.com', 'a@b', None], dtype=object)
+    out = cleaner.canonical_email(s)
+    assert out[:4].tolist() == ['johndoe@gmail.com', 'johndoe@gmail.com', 'a.b@outlook.com', 'a.b+x@naver.com']
+    assert out[4:].isna().all()
+
+
+def test_canonical_email_all_missing():
+    for s in (pd.Series([None, None], dtype=object), pd.Series([np.nan, np.nan]), pd.Series([], dtype=object)):
+        assert cleaner.canonical_email(s).isna().all()
+
+
+def test_contact_key_hash_matches_equivalent_phones():
+    s = pd.Series(['010-1234-5678', '+82 10 1234 5678', '01012345678', '010-9999-0000', None], dtype=object)
+    h = cleaner.contact_key_hash(s, cleaner.ROLE_PHONE)
+    assert h[0] == h[1] == h[2] != h[3]
+    assert pd.isna(h[4])
+
+
+def test_pipeline_with_empty_email_column():
+    df = pd.DataFrame({'이름': ['a', 'b'], '이메일': [None, None]})
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False)
+    buf.seek(0)
+    buf.name = 'empty_email.xlsx'
+    _, clean, _, msg = cleaner.run_cleaning_pipeline(buf, excel=False, use_cache=False)
+    assert msg == "Success"
+    assert len(clean['Sheet1']) == 2
+    assert cleaner.contact_key_frame(clean['Sheet1']).empty
@@ -0,0 +1,28 @@
+import pandas as pd
+
+from modules import cleaner
+
+
+def _normalize(col, values):
+    df = pd.DataFrame({col: pd.Series(values, dtype=object), '번호': range(len(values))})
+    return cleaner.normalize_strings(df)[col].tolist()
+
+
+def test_country_names_and_exact_codes():
+    out = _normalize('국가', ['Korea', 'U.S.A.', 'KR', 'USA', 'DE', 'Germany', '일본'])
+    assert out == ['대한민국', '미국', '대한민국', '미국', '독일', '독일', '일본']
+
+
+def test_free_text_is_not_a_country_code():
+    out = _normalize('국가', ['no', 'No', 'Seoul'])
+    assert out == ['no', 'No', 'Seoul']
+
+
+def test_na_placeholders_are_missing():
+    out = _normalize('국가', ['N/A', 'NA', 'n/a', 'NULL'])
+    assert all(pd.isna(v) for v in out)
+
+
+def test_region_column_keeps_codes():
+    out = _normalize('region', ['CA', 'GA', 'IN', 'DE', 'Korea'])
+    assert out == ['CA', 'GA', 'IN', 'DE', '대한민국']
@@ -0,0 +1,60 @@
+import difflib
+import random
+
+import numpy as np
+import pandas as pd
+
+from modules import cleaner
+
+
+def _values(seed, alphabet, n=60):
+    rnd = random.Random(seed)
+    base = [''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 25))) for _ in range(n)]
+    typos = []
+    for s in base:
+        c = list(s)
+        for _ in range(rnd.randint(0, 3)):
+            k = rnd.randint(0, len(c))
+            if rnd.random() < 0.5 and c:
+                c.pop(min(k, len(c) - 1))
+            else:
+                c.insert(k, rnd.choice(alphabet))
+        typos.append(''.join(c))
+    return list(dict.fromkeys(base + typos))
+
+
+def test_candidates_cover_every_similar_pair():
+    for seed, alphabet in enumerate(('abcde 가나', 'ab', 'abcdefghijklmnop')):
+        vals = _values(seed, alphabet)
+        for t in (0.5, 0.8, 0.9, 0.95):
+            found = set(map(tuple, cleaner.fuzzy_candidate_pairs(vals, t).tolist()))
+            for i in range(len(vals)):
+                for j in range(i + 1, len(vals)):
+                    if difflib.SequenceMatcher(None, vals[i], vals[j]).ratio() >= t:
+                        assert (i, j) in found, (t, vals[i], vals[j])
+
+
+def test_candidate_pairs_are_sorted_and_unique():
+    pairs = cleaner.fuzzy_candidate_pairs(_values(7, 'abcd'), 0.8)
+    assert (pairs[:, 0] < pairs[:, 1]).all()
+    rows = list(map(tuple, pairs.tolist()))
+    assert rows == sorted(set(rows))
+
+
+def test_find_fuzzy_duplicates():
+    df = pd.DataFrame({'회사': ['Samsung Electronics', 'Samsung Electronic', 'LG Chem', 'SK Hynix', None]})
+    out = cleaner.find_fuzzy_duplicates(df, ['회사'])
+    assert out[['val1', 'val2']].values.tolist() == [['Samsung Electronics', 'Samsung Electronic']]
+
+
+def test_popcount_fallback_matches_bitwise_count(monkeypatch):
+    rnd = np.random.default_rng(0)
+    x = rnd.integers(0, 2**63, size=1000, dtype=np.uint64) * np.uint64(2) + rnd.integers(0, 2, size=1000, dtype=np.uint64)
+    expected = [bin(v).count('1') for v in x.tolist()]
+    assert cleaner._popcount_unpacked(x).tolist() == expected
+
+    # numpy 2.0 미만처럼 fallback 으로 돌려도 후보 쌍이 같다
+    vals = _values(3, 'abcde 가나')
+    fast = cleaner.fuzzy_candidate_pairs(vals, 0.8)
+    monkeypatch.setattr(cleaner, '_popcount', cleaner._popcount_unpacked)
+    np.testing.assert_array_equal(cleaner.fuzzy_candidate_pairs(vals, 0.8), fast)
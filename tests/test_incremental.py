@@ -0,0 +1,57 @@
+import io
+
+import pandas as pd
+
+from modules import cleaner
+
+
+def _upload(sheets):
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf) as w:
+        for name, n in sheets.items():
+            pd.DataFrame({'이름': [f"P{i}" for i in range(n)], '이메일': [f"p{i}@x.com" for i in range(n)]}) \
+                .to_excel(w, sheet_name=name, index=False)
+    data = buf.getvalue()
+
+    def fresh():
+        src = io.BytesIO(data)
+        src.name = 'incremental.xlsx'
+        return src
+    return fresh
+
+
+def _run(upload, row_state):
+    stats = {}
+    _, clean, _, msg = cleaner.run_cleaning_pipeline(upload(), stats, excel=False, use_cache=False, row_state=row_state)
+    assert msg == "Success"
+    return clean, stats
+
+
+def test_incremental_is_opt_in_and_per_state():
+    upload = _upload({'s': 3})
+    _run(upload, None)
+    _, stats = _run(upload, None)
+    assert stats['delta_reused_rows'] == 0
+
+    mine, other = cleaner.RowState(), cleaner.RowState()
+    first, _ = _run(upload, mine)
+    again, stats = _run(upload, mine)
+    assert stats['delta_reused_rows'] == 3
+    pd.testing.assert_frame_equal(again['s'], first['s'])
+    # 다른 세션의 상태에는 남지 않는다
+    assert len(other) == 0
+    _, stats = _run(upload, other)
+    assert stats['delta_reused_rows'] == 0
+
+
+def test_row_state_is_capped_by_rows():
+    state = cleaner.RowState(max_rows=5)
+    _run(_upload({'a': 3, 'b': 3}), state)
+    # 두 시트를 합치면 6행이라 먼저 기록한 계보는 버린다
+    assert len(state) == 1 and state.rows == 3
+    assert state.get(cleaner.file_lineage('incremental.xlsx', 'b')) is not None
+
+    _run(_upload({'big': 6}), state)
+    # 혼자서 상한을 넘는 시트는 기록하지 않는다
+    assert state.get(cleaner.file_lineage('incremental.xlsx', 'big')) is None
+    assert state.rows <= 5
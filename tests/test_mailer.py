@@ -0,0 +1,55 @@
+import pandas as pd
+
+from modules import cleaner, mailer
+
+
+class FakeSMTP:
+    sent = []
+
+    def __init__(self, server, port):
+        pass
+
+    def login(self, user, pw):
+        pass
+
+    def send_message(self, msg):
+        FakeSMTP.sent.append(msg['To'])
+
+    def quit(self):
+        pass
+
+
+def test_force_clean_input_missing_values():
+    for v in (None, float('nan'), pd.NA, ''):
+        assert mailer.force_clean_input(v) == ""
+    assert mailer.force_clean_input('\xa0a@x.com ') == 'a@x.com'
+
+
+def test_bulk_send_skips_missing_email_in_typed_sheet(monkeypatch):
+    monkeypatch.setattr(mailer.smtplib, 'SMTP_SSL', FakeSMTP)
+    monkeypatch.setattr(mailer.time, 'sleep', lambda s: None)
+    FakeSMTP.sent = []
+    df = cleaner.apply_column_types(pd.DataFrame({
+        '이메일': ['a@x.com', None, 'c@x.com'],
+        '생성된_메시지': ['hi a', 'hi b', 'hi c'],
+    }))
+    assert df['이메일'].isna().iloc[1]
+    ok, success, fail, errors = mailer.send_bulk_emails(df, 'me@x.com', 'pw', '이메일', '제목', '생성된_메시지', 'smtp', 465)
+    assert ok and (success, fail, errors) == (2, 1, [])
+    assert FakeSMTP.sent == ['a@x.com', 'c@x.com']
+
+
+def test_fatal_error_closes_connection(monkeypatch):
+    closed = []
+
+    class BrokenSMTP(FakeSMTP):
+        def login(self, user, pw):
+            raise OSError('boom')
+
+        def close(self):
+            closed.append(True)
+
+    monkeypatch.setattr(mailer.smtplib, 'SMTP_SSL', BrokenSMTP)
+    ok, _, _, errors = mailer.send_bulk_emails(pd.DataFrame({'e': ['a@x.com'], 'b': ['x']}), 'me@x.com', 'pw',
+                                               'e', 's', 'b', 'smtp', 465)
+    assert not ok and errors == ['SMTP 오류: boom'] and closed
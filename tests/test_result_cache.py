@@ -0,0 +1,99 @@
+import datetime
+import decimal
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules import cleaner
+
+
+def _workbook():
+    df = pd.DataFrame({
+        '이름': ['Kim', 'Kim', 'Lee', 'Park', 'Park'],
+        '이메일': ['k@x.com', 'k@x.com', 'l@x.com', 'p@x.com', 'p@x.com'],
+        '평점': [5, 'five', 9, 7, None],
+        '메모': ['a', None, 'c', 3, 'e'],
+    })
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+# xlsx 에는 만든 시각이 들어가므로 같은 바이트를 다시 올린다 (초가 바뀌면 다른 파일이 됨)
+_DATA = _workbook()
+
+
+def _upload():
+    buf = io.BytesIO(_DATA)
+    buf.name = 'cache.xlsx'
+    return buf
+
+
+def test_cache_hit_equals_fresh_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(cleaner, 'RESULT_CACHE_DIR', str(tmp_path / 'rc'))
+    fresh_stats, hit_stats = {}, {}
+    _, fresh, fresh_trash, _ = cleaner.run_cleaning_pipeline(_upload(), fresh_stats, excel=False, use_cache=True)
+    _, hit, hit_trash, _ = cleaner.run_cleaning_pipeline(_upload(), hit_stats, excel=False, use_cache=True)
+    assert fresh_stats['result_cache'] == 'miss' and hit_stats['result_cache'] == 'hit'
+    for name in fresh:
+        pd.testing.assert_frame_equal(hit[name], fresh[name])
+    assert len(fresh_trash) == len(hit_trash) == 1
+    pd.testing.assert_frame_equal(hit_trash[0], fresh_trash[0])
+    # 숫자와 문자열이 섞인 컬럼은 값의 타입까지 그대로
+    assert [type(v) for v in hit_trash[0]['평점']] == [type(v) for v in fresh_trash[0]['평점']]
+
+
+def test_null_kinds_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(cleaner, 'RESULT_CACHE_DIR', str(tmp_path / 'rc'))
+    df = pd.DataFrame({
+        'nan': pd.Series(['a', np.nan], dtype=object),
+        'na': pd.Series(['a', pd.NA], dtype=object),
+        'mixed': pd.Series([None, np.nan], dtype=object),
+        'num': pd.Series([1, 'x'], dtype=object),
+    })
+    cleaner.save_result('k', {'s': df}, [])
+    out = cleaner.load_result('k')[0]['s']
+    assert isinstance(out['nan'][1], float) and np.isnan(out['nan'][1])
+    assert out['na'][1] is pd.NA
+    assert out['mixed'][0] is None and isinstance(out['mixed'][1], float)
+    assert out['num'].tolist() == [1, 'x']
+
+
+def test_mixed_values_keep_their_types_without_pickle(tmp_path, monkeypatch):
+    monkeypatch.setattr(cleaner, 'RESULT_CACHE_DIR', str(tmp_path / 'rc'))
+    values = ['a', 1, 2.5, True, None, pd.NA, pd.Timestamp('2024-05-01 09:30'),
+              datetime.datetime(2024, 5, 1, 9, 30, 15, 123), datetime.date(2024, 5, 1), datetime.time(9, 30), float('nan')]
+    df = pd.DataFrame({'mixed': pd.Series(values, dtype=object)})
+    cleaner.save_result('k', {'s': df}, [])
+    assert sorted(os.listdir(os.path.join(cleaner.RESULT_CACHE_DIR, 'k'))) == ['clean_0.arrow', 'meta.json']
+    out = cleaner.load_result('k')[0]['s']['mixed'].tolist()
+    assert [type(v) for v in out] == [type(v) for v in values]
+    assert out[:4] == values[:4] and out[4] is None and out[5] is pd.NA and np.isnan(out[-1])
+    assert out[6:10] == values[6:10]
+
+
+def test_unknown_value_types_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(cleaner, 'RESULT_CACHE_DIR', str(tmp_path / 'rc'))
+    df = pd.DataFrame({'mixed': pd.Series(['a', decimal.Decimal('1.5')], dtype=object)})
+    with pytest.raises(ValueError):
+        cleaner.save_result('k', {'s': df}, [])
+    assert cleaner.load_result('k') is None
+
+
+def test_cache_is_off_by_default(tmp_path, monkeypatch):
+    monkeypatch.setattr(cleaner, 'RESULT_CACHE_DIR', str(tmp_path / 'rc'))
+    stats = {}
+    cleaner.run_cleaning_pipeline(_upload(), stats, excel=False)
+    assert 'result_cache' not in stats
+    assert not os.path.exists(cleaner.RESULT_CACHE_DIR)
+
+
+def test_clear_result_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cleaner, 'RESULT_CACHE_DIR', str(tmp_path / 'rc'))
+    cleaner.run_cleaning_pipeline(_upload(), excel=False, use_cache=True)
+    assert os.listdir(cleaner.RESULT_CACHE_DIR)
+    cleaner.clear_result_cache()
+    assert not os.path.exists(cleaner.RESULT_CACHE_DIR)
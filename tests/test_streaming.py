@@ -0,0 +1,96 @@
+import io
+
+import pandas as pd
+
+from modules import cleaner
+
+
+def _workbook():
+    df = pd.DataFrame({
+        '이름': ['Kim', 'Lee', 'Park', 'Kim', 'Choi', 'Han'],
+        '이메일': ['NULL', 'NULL', 'p@x.com', 'k@x.com', '#N/A', 'k@x.com'],
+        '휴대폰': ['010-1111-2222', 'N/A', '010-3333-4444', '010-1111-2222', None, None],
+        '소속': ['A', 'B', 'C', 'A', 'NULL', 'D'],
+    })
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf) as w:
+        df.to_excel(w, sheet_name='s1', index=False)
+        df.iloc[::-1].to_excel(w, sheet_name='s2', index=False)
+    return buf.getvalue()
+
+
+def _source(data):
+    buf = io.BytesIO(data)
+    buf.name = 'stream.xlsx'
+    return buf
+
+
+def test_single_chunk_stream_matches_in_memory(tmp_path):
+    data = _workbook()
+    for global_dedup in (False, True):
+        out_path = str(tmp_path / f"stream_{global_dedup}.xlsx")
+        _, _, _, msg = cleaner.run_streaming_pipeline(_source(data), out_path, global_dedup=global_dedup)
+        assert msg == "Success"
+        buf, _, _, msg = cleaner.run_cleaning_pipeline(_source(data), global_dedup=global_dedup, use_cache=False)
+        assert msg == "Success"
+        streamed = pd.read_excel(out_path, sheet_name=None)
+        in_memory = pd.read_excel(buf, sheet_name=None)
+        assert list(streamed) == list(in_memory)
+        for name in in_memory:
+            pd.testing.assert_frame_equal(streamed[name], in_memory[name], check_dtype=False)
+
+
+def test_null_strings_are_missing_in_chunks():
+    df = cleaner._chunk_frame([('NULL', 'a'), (None, '#N/A'), ('x', 'n/a')], ['c1', 'c2'])
+    assert df.isna().to_numpy().tolist() == [[True, False], [True, True], [False, True]]
+
+
+def _people(n):
+    # 행마다 다른 사람 (이메일·휴대폰·소속이 모두 다름)
+    return pd.DataFrame({
+        '이름': [f"P{i}" for i in range(n)],
+        '이메일': [f"p{i}@x.com" for i in range(n)],
+        '휴대폰': [f"010-1000-{i:04d}" for i in range(n)],
+        '소속': [f"Org{i}" for i in range(n)],
+    })
+
+
+def test_rows_past_sheet_limit_continue_on_next_sheet(tmp_path, monkeypatch):
+    # 머리글 포함 4행 → 시트마다 데이터 3행
+    monkeypatch.setattr(cleaner, 'XLSX_MAX_ROWS', 4)
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf) as w:
+        _people(7).to_excel(w, sheet_name='s1', index=False)
+        # 뒤 시트의 사람은 s1 의 마지막 행(s1_3 시트에 기록됨)과 같다
+        _people(7).iloc[[6]].to_excel(w, sheet_name='s2', index=False)
+    out_path = str(tmp_path / 'limit.xlsx')
+    _, clean_counts, trash_counts, msg = cleaner.run_streaming_pipeline(
+        _source(buf.getvalue()), out_path, global_dedup=True, chunk_rows=2)
+    assert msg == "Success"
+    assert clean_counts == {'s1': 3, 's1_2': 3, 's1_3': 1, 's2': 0}
+    assert trash_counts == {'s2': 1}
+    book = pd.read_excel(out_path, sheet_name=None)
+    assert list(book) == ['s1', 's1_2', 's1_3', 's2', '휴지통_s2']
+    names = pd.concat([book[n] for n in ('s1', 's1_2', 's1_3')])['이름'].tolist()
+    assert names == [f"P{i}" for i in range(7)]
+    assert book['휴지통_s2'][cleaner.KEEP_SHEET_COL].tolist() == ['s1_3']
+
+
+def test_normalization_memo_is_capped_between_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(cleaner, 'STREAM_MEMO_ENTRIES', 2)
+    caches = []
+
+    class Recorded(cleaner.NormalizationCache):
+        def __init__(self):
+            super().__init__()
+            caches.append(self)
+
+    monkeypatch.setattr(cleaner, 'NormalizationCache', Recorded)
+    buf = io.BytesIO()
+    _people(10).to_excel(buf, index=False)
+    stats = {}
+    _, clean_counts, _, msg = cleaner.run_streaming_pipeline(
+        _source(buf.getvalue()), str(tmp_path / 'memo.xlsx'), stats=stats, chunk_rows=3)
+    assert msg == "Success" and sum(clean_counts.values()) == 10
+    assert all(len(t) <= 2 for t in caches[0].memo.values())
+    assert stats['memo_entries'] == caches[0].entries
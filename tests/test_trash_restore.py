@@ -0,0 +1,24 @@
+import io
+
+import pandas as pd
+
+from modules import cleaner
+
+
+def test_restored_rows_drop_trash_only_columns():
+    people = pd.DataFrame({'이름': ['Kim', 'Lee'], '이메일': ['k@x.com', 'l@x.com'], '소속': ['A', 'B']})
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf) as w:
+        people.to_excel(w, sheet_name='s1', index=False)
+        people.iloc[[0]].to_excel(w, sheet_name='s2', index=False)
+    buf.seek(0)
+    buf.name = 'restore.xlsx'
+    _, clean, trash, msg = cleaner.run_cleaning_pipeline(buf, global_dedup=True, excel=False, use_cache=False)
+    assert msg == "Success"
+    rows = pd.concat(trash)
+    assert {'[원본시트]', cleaner.KEEP_SHEET_COL} <= set(rows.columns)
+
+    restored = cleaner.restore_trash_rows(clean['s1'], rows)
+    assert list(restored.columns) == list(clean['s1'].columns)
+    assert restored['이름'].tolist() == ['Kim', 'Lee', 'Kim']
+    assert restored[cleaner.STATUS_COL].notna().all()
@@ -0,0 +1,59 @@
+import io
+
+import pandas as pd
+
+from modules import cleaner
+
+
+def _book():
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf) as w:
+        for n in ('a', 'b'):
+            pd.DataFrame({'이름': ['Kim', 'Lee'], '회사': ['(주)한빛', '한빛']}).to_excel(w, sheet_name=n, index=False)
+    buf.seek(0)
+    buf.name = 'workers.xlsx'
+    return cleaner.SourceBook(buf)
+
+
+def test_small_books_run_serially(monkeypatch):
+    monkeypatch.setattr(cleaner.os, 'cpu_count', lambda: 8)
+    stats = {}
+    _, clean, _, msg = cleaner.run_cleaning_pipeline(_book(), stats, excel=False, use_cache=False)
+    assert msg == "Success" and list(clean) == ['a', 'b']
+    assert stats['workers'] == 1
+    # 직렬이면 시트 사이에 정규화 메모를 같이 쓴다
+    assert stats['cache_hits'] > 0
+
+
+def test_sheet_workers_threshold(monkeypatch):
+    book = _book()
+    sheets = [(book.name, book, n) for n in book.sheet_names]
+    monkeypatch.setattr(cleaner.os, 'cpu_count', lambda: 8)
+    assert cleaner.sheet_workers(sheets) == 1
+    monkeypatch.setattr(cleaner, 'PARALLEL_MIN_ROWS', 4)
+    assert cleaner.sheet_workers(sheets) == 8
+    monkeypatch.setattr(cleaner.os, 'cpu_count', lambda: 1)
+    assert cleaner.sheet_workers(sheets) == 1
+
+
+def test_copy_on_write_only_inside_pipeline(monkeypatch):
+    seen = []
+    split = cleaner.split_duplicates
+
+    def recording(df):
+        seen.append(pd.get_option('mode.copy_on_write'))
+        return split(df)
+
+    monkeypatch.setattr(cleaner, 'split_duplicates', recording)
+    before = pd.get_option('mode.copy_on_write')
+    _, clean, _, msg = cleaner.run_cleaning_pipeline(_book(), excel=False, use_cache=False)
+    assert msg == "Success" and seen == [True, True]
+    assert pd.get_option('mode.copy_on_write') == before
+
+
+def test_parallel_sheets_match_serial():
+    _, serial, _, _ = cleaner.run_cleaning_pipeline(_book(), excel=False, use_cache=False, workers=1)
+    _, parallel, _, msg = cleaner.run_cleaning_pipeline(_book(), excel=False, use_cache=False, workers=2)
+    assert msg == "Success" and list(parallel) == list(serial)
+    for name in serial:
+        pd.testing.assert_frame_equal(parallel[name], serial[name])